@@ -1,82 +1,259 @@
 import pyaudio
-import mysql.connector
-import json
+import sys
 import os
 import time
-import subprocess
+import atexit
 import threading
-from vosk import Model, KaldiRecognizer
+from collections import Counter
+from functools import partial
+from vosk import Model
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-# Load Vosk Model
-model_path = os.getenv("VOSK_MODEL_PATH", "vosk-model")
-model = Model(model_path)
-recognizer = KaldiRecognizer(model, 16000)
-
-# Connect to local MySQL database
-db = mysql.connector.connect(
-    host=os.getenv("MYSQL_HOST", "localhost"),
-    user=os.getenv("MYSQL_USER", "pi_user"),
-    password=os.getenv("MYSQL_PASSWORD", "yourpassword"),
-    database=os.getenv("MYSQL_DATABASE", "curse_word_db")
+# Import the scripts from the scripts directory
+sys.path.append(os.path.join(os.path.dirname(__file__), 'scripts'))
+from db_pool import ConnectionPool, make_connect
+from unifi_client import get_client, resolve_targets
+from block_state import BlockStateManager
+from status_file import StatusReporter, DEFAULT_STATUS_FILE
+from play_audio import PlaybackService, playback_tracker, warm_cache
+from audio_capture import AudioCapture, parse_audio_inputs, find_input_device
+from detection_pipeline import build_pipeline, pipeline_settings, SAMPLE_RATE
+from recognizer_process import RecognizerProcess
+from count_store import WordCountStore, DEFAULT_SOURCE
+from detection_actions import make_detection_handler
+import sampling_profiler
+from metrics import MetricFamilies, process_stats
+
+# Pooled connections to the local MySQL database; they reconnect with backoff
+# when the server restarts or an idle connection times out
+db_pool = ConnectionPool(
+    make_connect(
+        "mysql",
+        host=os.getenv("MYSQL_HOST", "localhost"),
+        user=os.getenv("MYSQL_USER", "pi_user"),
+        password=os.getenv("MYSQL_PASSWORD", "yourpassword"),
+        database=os.getenv("MYSQL_DATABASE", "curse_word_db"),
+        timeout=int(os.getenv("DB_QUERY_TIMEOUT", "10"))
+    ),
+    size=int(os.getenv("DB_POOL_SIZE", "2")),
+    retries=int(os.getenv("DB_RECONNECT_ATTEMPTS", "5"))
 )
-cursor = db.cursor()
 
 # List of curse words
 curse_words_str = os.getenv("CURSE_WORDS", "curse1,curse2,curse3")
 curse_words = [word.strip() for word in curse_words_str.split(",")]
 
-# Import the scripts from the scripts directory
-import sys
-sys.path.append(os.path.join(os.path.dirname(__file__), 'scripts'))
-from block_device import block_device as block
-from play_audio import play_message
-
-# Function to call block_device.py script
-def block_device():
-    try:
-        # Execute blocking
-        success = block()
-        print(f"Device blocking {'succeeded' if success else 'failed'}")
-        return success
-    except Exception as e:
-        print(f"Error blocking device: {e}")
-        return False
-
-# Audio playback function for the warning message
-def play_warning_audio():
-    try:
-        # Get custom message from environment or use default
-        custom_message = os.getenv("CURSE_WORD_WARNING", "You have said a bad word")
-        play_message(custom_message)
-    except Exception as e:
-        print(f"Failed to play warning audio: {e}")
-
-# Audio input setup
+# Audio sources: one microphone per room ("name=device" entries in AUDIO_INPUTS),
+# or the default input; detections are attributed to the source that heard them
+source_device = os.getenv("SOURCE_DEVICE") or DEFAULT_SOURCE
+audio_inputs = [(f"{source_device}/{name}", device)
+                for name, device in parse_audio_inputs(os.getenv("AUDIO_INPUTS", ""))]
+if not audio_inputs:
+    audio_inputs = [(source_device, None)]
+
+# Echo guard, VAD, speech recognizer and keyword matcher settings
+settings = pipeline_settings()
+model_path = os.getenv("VOSK_MODEL_PATH", "vosk-model")
+recognizer_process = None
+if os.getenv("RECOGNIZER_PROCESS", "false").lower() == "true":
+    # Decode in a worker process fed through shared memory, so recognition
+    # gets its own core; it is forked before any other thread starts
+    recognizer_process = RecognizerProcess(
+        model_path, curse_words, settings, [name for name, _ in audio_inputs],
+        tracker=playback_tracker, slots=int(os.getenv("RECOGNIZER_PROCESS_SLOTS", "32")))
+    recognizer_process.start()
+    atexit.register(recognizer_process.close)
+else:
+    # Load the Vosk model once; every source gets its own recognizer on top of it
+    model = Model(model_path)
+
+# Counts are cached in memory; counts, detection events and hourly/daily
+# rollups are written to the database in batches in the background
+counts = WordCountStore(
+    db_pool,
+    flush_size=int(os.getenv("DB_FLUSH_SIZE", "20")),
+    flush_interval=float(os.getenv("DB_FLUSH_INTERVAL", "5")),
+    source=source_device,
+    max_pending=int(os.getenv("DB_MAX_PENDING", "10000"))
+)
+try:
+    counts.warm()
+except Exception as e:
+    print(f"Could not load word counts, starting from zero: {e}")
+counts.start()
+atexit.register(counts.close)
+
+# Render the configured warnings to the TTS cache ahead of the first detection
+threading.Thread(target=warm_cache, name="tts-warm", daemon=True).start()
+
+# Device blocking goes through a cached, debounced block-state manager so a
+# burst of detections costs at most one controller call
+block_targets = resolve_targets(
+    [t.strip() for t in os.getenv("BLOCK_TARGETS", "").split(",") if t.strip()])
+block_states = BlockStateManager(
+    get_client(),
+    ttl=int(os.getenv("BLOCK_STATE_TTL", "300")),
+    reconcile_interval=int(os.getenv("BLOCK_RECONCILE_INTERVAL", "300")),
+    debounce=float(os.getenv("BLOCK_DEBOUNCE", "5")),
+    workers=max(2, len(block_targets))
+)
+block_states.start()
+
+# Warnings are spoken one at a time by a single playback worker
+playback = PlaybackService(max_queue=int(os.getenv("PLAYBACK_QUEUE_SIZE", "8")))
+playback.start()
+
+# Count, block and warn on every detection
+source_detections = Counter()
+word_detections = Counter()  # (source, word) -> detections
+pipelines = {}
+handle_detections = make_detection_handler(
+    counts, block_states, playback, block_targets,
+    warning=os.getenv("CURSE_WORD_WARNING", "You have said a bad word"),
+    pipelines=pipelines, source_detections=source_detections, word_detections=word_detections)
+for name, _ in audio_inputs:
+    if recognizer_process is not None:
+        pipelines[name] = recognizer_process.sources[name]
+        pipelines[name].on_detections = partial(handle_detections, name)
+    else:
+        pipelines[name] = build_pipeline(model, curse_words, partial(handle_detections, name),
+                                         settings, tracker=playback_tracker)
+print(f"Speech recognizer mode: {settings['recognizer_mode']}")
+
+# Audio capture configuration
+chunk_frames = settings["chunk_frames"]
+buffer_chunks = int(os.getenv("AUDIO_BUFFER_CHUNKS", "64"))
+stats_interval = int(os.getenv("AUDIO_STATS_INTERVAL", "60"))
+
+# Audio input setup: every microphone's callback fills its own ring buffer so
+# slow recognition never drops frames
 p = pyaudio.PyAudio()
-stream = p.open(format=pyaudio.paInt16, channels=1, rate=16000, input=True, frames_per_buffer=8000)
-stream.start_stream()
+captures = {}
+for name, device in audio_inputs:
+    captures[name] = AudioCapture(chunk_frames=chunk_frames, buffer_chunks=buffer_chunks,
+                                  name=f"audio-capture-{name}")
+    stream = p.open(format=pyaudio.paInt16, channels=1, rate=SAMPLE_RATE, input=True,
+                    input_device_index=find_input_device(p, device), frames_per_buffer=chunk_frames,
+                    stream_callback=captures[name].callback, start=False)
+    captures[name].start(stream)
+
+# Per-source capture, echo suppression, VAD and recognizer counters
+def source_stats(name):
+    pipeline = pipelines[name]
+    stats = {
+        "audio_capture": captures[name].stats(),
+        "pipeline": pipeline.stats(),
+        "detections": source_detections[name],
+    }
+    if pipeline.vad:
+        stats["vad"] = pipeline.vad.stats()
+    if pipeline.echo_guard:
+        stats["echo_suppression"] = pipeline.echo_guard.stats()
+    return stats
+
+# Metric families for the health check's /metrics endpoint, built from the
+# plain counters the components already keep
+def collect_metrics():
+    m = MetricFamilies()
+    for name, pipeline in pipelines.items():
+        capture = captures[name].stats()
+        m.counter("audio_chunks_captured_total", "Audio chunks read from the microphone",
+                  capture["chunks_captured"], source=name)
+        m.counter("audio_chunks_dropped_total", "Audio chunks overwritten before recognition",
+                  capture["chunks_dropped"], source=name)
+        m.counter("audio_overflows_total", "PortAudio input overflows",
+                  capture["overflows"], source=name)
+        if pipeline.echo_guard:
+            m.counter("audio_chunks_suppressed_total", "Audio chunks skipped during playback",
+                      pipeline.echo_guard.suppressed, source=name)
+
+        # Decoder counters live in the worker process in RECOGNIZER_PROCESS mode
+        stats = pipeline.stats()
+        decoder = stats.get("worker", stats)
+        m.counter("chunks_decoded_total", "Audio chunks passed to the recognizer",
+                  decoder.get("chunks_decoded", 0), source=name)
+        m.counter("decoded_audio_seconds_total", "Seconds of audio passed to the recognizer",
+                  decoder.get("audio_seconds", 0), source=name)
+        m.gauge("real_time_factor", "Decode time divided by decoded audio duration",
+                decoder.get("rtf"), source=name)
+        m.histogram("decode_seconds", "Recognizer time per audio chunk",
+                    decoder.get("decode_histogram"), source=name)
+
+    for (source, word), count in list(word_detections.items()):
+        m.counter("detections_total", "Curse words detected", count, source=source, word=word)
+
+    store = counts.stats()
+    m.histogram("db_flush_seconds", "Duration of successful database flushes", store["flush_latency"])
+    m.counter("db_flush_errors_total", "Failed database flushes", store["flush_errors"])
+    m.gauge("db_pending_events", "Detections waiting to be written", store["queued"] + store["pending"] + store["provisional"])
+    m.counter("db_dropped_events_total", "Detections dropped while the database was unreachable",
+              store["events_dropped"])
+
+    blocking = block_states.snapshot()
+    m.histogram("controller_call_seconds", "Duration of UniFi block/unblock calls", blocking["call_latency"])
+    m.counter("controller_calls_total", "UniFi block/unblock calls", blocking["calls"])
+    m.counter("controller_failures_total", "Failed UniFi block/unblock calls", blocking["failures"])
+
+    audio = playback.stats()
+    m.gauge("playback_queue_depth", "Warnings waiting to be played", audio["queue_depth"])
+    m.counter("playback_played_total", "Warnings played", audio["played"])
+    m.counter("playback_dropped_total", "Warnings dropped from a full queue", audio["dropped"])
+
+    processes = {"detector": None}
+    if recognizer_process is not None:
+        processes["recognizer"] = recognizer_process.stats()["worker_pid"]
+    for role, pid in processes.items():
+        usage = process_stats(pid)
+        if usage:
+            m.gauge("process_resident_memory_bytes", "Resident memory", usage["rss_bytes"], process=role)
+            m.counter("process_cpu_seconds_total", "User and system CPU time", usage["cpu_seconds"],
+                      process=role)
+    return m.families()
+
+# Sample thread stacks on SIGUSR1 (e.g. from the health check's /profile);
+# installed before the status file advertises our pid
+sampling_profiler.install("detector")
+
+# Publish pipeline state for the health check service
+status = StatusReporter(os.getenv("STATUS_FILE", DEFAULT_STATUS_FILE),
+                        interval=int(os.getenv("STATUS_INTERVAL", "5")))
+status.register("sources", lambda: {name: source_stats(name) for name in pipelines})
+if recognizer_process is not None:
+    status.register("recognizer_process", recognizer_process.stats)
+status.register("counts", counts.stats)
+status.register("db_pool", db_pool.stats)
+status.register("block_state", block_states.snapshot)
+status.register("playback", playback.stats)
+status.register("metrics", collect_metrics)
+status.start()
+
+# Feed one source's captured audio through its recognizer
+def recognize(name):
+    capture, pipeline = captures[name], pipelines[name]
+    while True:
+        chunk = capture.read(timeout=1.0)
+        if chunk is not None:
+            pipeline.feed(*chunk)
+
+recognizers = [threading.Thread(target=recognize, args=(name,), name=f"recognize-{name}", daemon=True)
+               for name in pipelines]
+for thread in recognizers:
+    thread.start()
+
+print(f"Curse word detector started. Listening on {len(audio_inputs)} input(s)...")
+last_stats = time.time()
 
 while True:
-    data = stream.read(4000, exception_on_overflow=False)
-    if recognizer.AcceptWaveform(data):
-        result = json.loads(recognizer.Result())
-        detected_word = result.get("text", "").lower()
-        
-        if any(curse in detected_word for curse in curse_words):
-            print(f"Detected curse word: {detected_word}")
-            cursor.execute("UPDATE word_counts SET count = count + 1 WHERE word = %s", (detected_word,))
-            db.commit()
-            
-            # Block the device when curse word detected
-            blocking_thread = threading.Thread(target=block_device)
-            blocking_thread.start()
-            
-            # Play warning message through speakers
-            play_warning_thread = threading.Thread(target=play_warning_audio)
-            play_warning_thread.start()
-        else:
-            print("No curse word detected.")
\ No newline at end of file
+    time.sleep(1.0)
+    if not all(thread.is_alive() for thread in recognizers):
+        # e.g. the recognizer process died; exit so the container restarts
+        print("A recognition thread stopped, exiting")
+        sys.exit(1)
+
+    if stats_interval and time.time() - last_stats >= stats_interval:
+        for name in pipelines:
+            print(f"Source {name} stats: {source_stats(name)}")
+        last_stats = time.time()
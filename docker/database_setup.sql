@@ -9,6 +9,35 @@ CREATE TABLE IF NOT EXISTS word_counts (
     last_detected TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
 );
 
+-- Append-only log of every detection, written in batches by the detector
+CREATE TABLE IF NOT EXISTS detection_events (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    detected_at DATETIME(3) NOT NULL,
+    word VARCHAR(50) NOT NULL,
+    confidence FLOAT NULL,
+    source_device VARCHAR(64) NOT NULL,
+    INDEX idx_events_detected_at (detected_at),
+    INDEX idx_events_word_detected_at (word, detected_at),
+    INDEX idx_events_source_detected_at (source_device, detected_at)
+);
+
+-- Rollups maintained in the same transaction as the event inserts
+CREATE TABLE IF NOT EXISTS detection_rollup_hourly (
+    bucket_start DATETIME NOT NULL,
+    word VARCHAR(50) NOT NULL,
+    source_device VARCHAR(64) NOT NULL,
+    count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket_start, word, source_device)
+);
+
+CREATE TABLE IF NOT EXISTS detection_rollup_daily (
+    bucket_date DATE NOT NULL,
+    word VARCHAR(50) NOT NULL,
+    source_device VARCHAR(64) NOT NULL,
+    count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket_date, word, source_device)
+);
+
 -- The script will replace these placeholders at runtime
 -- Note: The actual values will come from the CURSE_WORDS environment variable
 INSERT INTO word_counts (word) 
@@ -1,21 +1,53 @@
+import hmac
 import os
+import random
+import socket
+import sys
 import time
 import threading
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify, request
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+sys.path.append(os.path.join(os.path.dirname(__file__), 'scripts'))
+from status_file import read_status, DEFAULT_STATUS_FILE
+from metrics import MetricFamilies, process_stats, render_prometheus
+import heartbeat_protocol
+from heartbeat_sender import HeartbeatStats, Ticker, parse_monitors
+import sampling_profiler
+
 # Get configuration from environment variables
 monitor_ip = os.getenv("MONITOR_IP", "192.168.1.2")
 monitor_port = os.getenv("MONITOR_PORT", "5000")
 heartbeat_interval = int(os.getenv("HEARTBEAT_INTERVAL", "30"))
+# Several monitors as host[:port] pairs (defaults to MONITOR_IP:MONITOR_PORT)
+monitors = parse_monitors(os.getenv("MONITORS") or f"{monitor_ip}:{monitor_port}", monitor_port)
+heartbeat_jitter = float(os.getenv("HEARTBEAT_JITTER", "0.1"))
+heartbeat_timeout = (float(os.getenv("HEARTBEAT_CONNECT_TIMEOUT", "2")),
+                     float(os.getenv("HEARTBEAT_READ_TIMEOUT", "5")))
 flask_port = int(os.getenv("FLASK_PORT", "5000"))
+status_file = os.getenv("STATUS_FILE", DEFAULT_STATUS_FILE)
+# Identity of this Pi in the monitor's node table ("pi" is the monitor's single-Pi default)
+node_name = os.getenv("NODE_NAME", "").strip() or "pi"
+# Heartbeats go over http, udp (signed datagrams with a health digest) or both
+heartbeat_transport = os.getenv("HEARTBEAT_TRANSPORT", "http").lower()
+heartbeat_key = os.getenv("HEARTBEAT_KEY", "").encode()
+heartbeat_udp_port = int(os.getenv("HEARTBEAT_UDP_PORT", "5001"))
+heartbeat_udp_interval = float(os.getenv("HEARTBEAT_UDP_INTERVAL", "1"))
+status_interval = int(os.getenv("STATUS_INTERVAL", "5"))
+# Without a token, /profile only answers requests from this host
+profile_token = os.getenv("PROFILE_TOKEN", "")
 
 # Status tracking
 last_heartbeat = time.time()
+heartbeat_stats = {}
+heartbeat_tickers = {}
+# One profile at a time; each holds a request thread for its whole duration
+profile_lock = threading.Lock()
 app = Flask(__name__)
 
 @app.route('/heartbeat', methods=['POST'])
@@ -31,35 +63,206 @@ def check_status():
     global last_heartbeat
     time_since_last = time.time() - last_heartbeat
     
+    # Latest snapshot from the detector (block state, audio and database stats)
+    detector = read_status(status_file)
+    
+    # Delivery of our own heartbeats to each monitor
+    heartbeats = {
+        "monitors": {name: stats.snapshot() for name, stats in list(heartbeat_stats.items())},
+        "missed_ticks": {name: ticker.missed for name, ticker in list(heartbeat_tickers.items())},
+    }
+    
     if time_since_last > heartbeat_interval * 2:
         return jsonify({
             "status": "Pi Disconnected", 
             "last_heartbeat": last_heartbeat,
-            "seconds_ago": time_since_last
+            "seconds_ago": time_since_last,
+            "detector": detector,
+            "heartbeats": heartbeats
         })
     else:
         return jsonify({
             "status": "Pi Active", 
             "last_heartbeat": last_heartbeat,
-            "seconds_ago": time_since_last
+            "seconds_ago": time_since_last,
+            "detector": detector,
+            "heartbeats": heartbeats
         })
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Endpoint exposing detector metrics in the Prometheus text format"""
+    detector = read_status(status_file)
+    families = list(detector.get("metrics", [])) if detector else []
+
+    # Age of the detector's last status snapshot, and this service's own usage
+    m = MetricFamilies()
+    if detector:
+        m.gauge("status_age_seconds", "Seconds since the detector last wrote its status",
+                round(time.time() - detector["updated"], 1))
+    usage = process_stats()
+    m.gauge("process_resident_memory_bytes", "Resident memory", usage["rss_bytes"], process="health_check")
+    m.counter("process_cpu_seconds_total", "User and system CPU time", usage["cpu_seconds"],
+              process="health_check")
+
+    # Merge samples into the detector's families of the same name
+    merged = {family["name"]: family for family in families}
+    for family in m.families():
+        if family["name"] in merged:
+            merged[family["name"]]["samples"] += family["samples"]
+        else:
+            merged[family["name"]] = family
+    return Response(render_prometheus(merged.values()), mimetype="text/plain; version=0.0.4")
+
+@app.route('/profile', methods=['GET'])
+def profile():
+    """Endpoint sampling the detector's thread stacks (collapsed-stack text for flame graphs)"""
+    if not sampling_profiler.PROFILER_ENABLED:
+        return jsonify({"error": "Profiler is disabled"}), 404
+    if profile_token:
+        if not hmac.compare_digest(request.headers.get("Authorization", "").encode(),
+                                   f"Bearer {profile_token}".encode()):
+            return jsonify({"error": "Invalid profile token"}), 403
+    elif request.remote_addr not in ("127.0.0.1", "::1"):
+        return jsonify({"error": "Profiling is only allowed from localhost without PROFILE_TOKEN"}), 403
+    try:
+        seconds = float(request.args.get("seconds", "10"))
+        interval_ms = float(request.args.get("interval_ms", "10"))
+    except ValueError:
+        return jsonify({"error": "seconds and interval_ms must be numbers"}), 400
+    if not (0 < seconds <= 120 and 5 <= interval_ms <= 1000):
+        return jsonify({"error": "seconds must be in (0, 120] and interval_ms in [5, 1000]"}), 400
+
+    # The status file outlives the container on the data volume; a stale one
+    # names pids that may now belong to other processes, which SIGUSR1 would kill
+    detector = read_status(status_file)
+    if not detector:
+        return jsonify({"error": "Detector status unavailable"}), 503
+    if time.time() - detector["updated"] > status_interval * 3:
+        return jsonify({"error": "Detector status is stale"}), 503
+
+    pids = [detector["pid"]]
+    worker = detector.get("recognizer_process") or {}
+    if worker.get("worker_pid") and worker.get("worker_alive") and worker.get("worker_ready"):
+        pids.append(worker["worker_pid"])
+    interval = interval_ms / 1000
+
+    if not profile_lock.acquire(blocking=False):
+        return jsonify({"error": "A profile is already running"}), 409
+    try:
+        stacks = sampling_profiler.request_profile(pids, seconds, interval)
+    except OSError as e:
+        return jsonify({"error": f"Could not signal the detector: {e}"}), 503
+    finally:
+        profile_lock.release()
+    if not stacks:
+        return jsonify({"error": "The detector did not answer in time"}), 504
+    return Response(stacks, mimetype="text/plain")
+
+def post_heartbeat(session, monitor):
+    """Send one HTTP heartbeat to a monitor and record its latency"""
+    host, port = monitor
+    stats = heartbeat_stats[f"http://{host}:{port}"]
+    started = time.perf_counter()
+    try:
+        response = session.post(f"http://{host}:{port}/heartbeat", json={"node": node_name},
+                                timeout=heartbeat_timeout)
+        response.raise_for_status()
+        stats.success(time.perf_counter() - started)
+        print(f"Heartbeat sent to {host}: {response.status_code}")
+    except Exception as e:
+        stats.failure(e)
+        print(f"Failed to send heartbeat to {host}:", e)
+
+def heartbeat_loop(session, monitor):
+    """Thread function to send heartbeats to one monitor on its own schedule"""
+    host, port = monitor
+    ticker = heartbeat_tickers[f"http://{host}:{port}"] = Ticker(heartbeat_interval, heartbeat_jitter)
+    while True:
+        post_heartbeat(session, monitor)
+        ticker.wait()
+
 def send_heartbeats():
-    """Thread function to send heartbeats"""
-    heartbeat_url = f"http://{monitor_ip}:{monitor_port}/heartbeat"
+    """Start one heartbeat thread per monitor"""
+    for host, port in monitors:
+        heartbeat_stats[f"http://{host}:{port}"] = HeartbeatStats()
+    
+    # Keep-alive connections, one pool per monitor
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=len(monitors), pool_maxsize=len(monitors)))
+    
+    # A slow or hung monitor only delays its own heartbeats, up to the timeouts
+    for host, port in monitors:
+        threading.Thread(target=heartbeat_loop, args=(session, (host, port)),
+                         name=f"heartbeat-{host}", daemon=True).start()
+
+def health_digest(detector):
+    """
+    Summarize the detector status for a UDP heartbeat
+    
+    Args:
+        detector: Status file contents, or None
+    
+    Returns:
+        Dict with the heartbeat_protocol.DIGEST_FIELDS keys
+    """
+    if not detector:
+        return {"alive": False}
+    age = time.time() - detector["updated"]
+    sources = detector.get("sources") or {}
+    pipelines = [source.get("pipeline", {}) for source in sources.values()]
+    rtfs = [p.get("worker", p).get("rtf") for p in pipelines]
+    counts = detector.get("counts") or {}
+    return {
+        # The detector rewrites its status every STATUS_INTERVAL seconds
+        "alive": age < status_interval * 3,
+        "status_age": age,
+        "rtf": max([rtf for rtf in rtfs if rtf is not None], default=None),
+        "capture_queue": max([s.get("audio_capture", {}).get("buffered", 0) for s in sources.values()], default=0),
+        "decode_backlog": max([p.get("backlog") or 0 for p in pipelines], default=0),
+        "db_queue": counts.get("queued", 0) + counts.get("pending", 0) + counts.get("provisional", 0),
+        "playback_queue": (detector.get("playback") or {}).get("queue_depth", 0),
+    }
+
+def send_udp_heartbeats():
+    """Thread function to send signed UDP heartbeats with a health digest"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    for host, _ in monitors:
+        heartbeat_stats[f"udp://{host}:{heartbeat_udp_port}"] = HeartbeatStats()
     
+    # A new epoch per start lets the monitor tell a restart from a replay
+    epoch = random.SystemRandom().getrandbits(32)
+    seq = 0
+    ticker = heartbeat_tickers["udp"] = Ticker(heartbeat_udp_interval, heartbeat_jitter)
     while True:
+        seq += 1
         try:
-            response = requests.post(heartbeat_url)
-            print(f"Heartbeat sent: {response.status_code}")
+            digest = health_digest(read_status(status_file))
+            datagram = heartbeat_protocol.encode(heartbeat_key, node_name, epoch, seq, digest)
         except Exception as e:
-            print("Failed to send heartbeat:", e)
-        time.sleep(heartbeat_interval)
+            print("Failed to build UDP heartbeat:", e)
+            ticker.wait()
+            continue
+        for host, _ in monitors:
+            stats = heartbeat_stats[f"udp://{host}:{heartbeat_udp_port}"]
+            try:
+                sock.sendto(datagram, (host, heartbeat_udp_port))
+                stats.success()
+            except OSError as e:
+                stats.failure(e)
+                print(f"Failed to send UDP heartbeat to {host}:", e)
+        ticker.wait()
 
 if __name__ == "__main__":
-    # Start heartbeat sender in a separate thread
-    heartbeat_thread = threading.Thread(target=send_heartbeats, daemon=True)
-    heartbeat_thread.start()
+    # Start heartbeat senders in separate threads
+    if heartbeat_transport in ("http", "both"):
+        send_heartbeats()
+    if heartbeat_transport in ("udp", "both"):
+        if heartbeat_key:
+            udp_thread = threading.Thread(target=send_udp_heartbeats, daemon=True)
+            udp_thread.start()
+        else:
+            print("HEARTBEAT_KEY is not set, UDP heartbeats are disabled")
     
     # Start Flask server
     print(f"Starting health check service on port {flask_port}")
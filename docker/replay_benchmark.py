@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""
+Offline replay benchmark for the curse word detection pipeline.
+
+Feeds recordings through the same echo guard / VAD / recognizer / matcher
+pipeline as curse_word_detector.py, and hands the detections to the same
+action path (WordCountStore, BlockStateManager, PlaybackService) with the
+database pool, UniFi client and speaker replaced by in-memory stubs. Reports:
+
+- real-time factor (processing time / audio duration)
+- per-chunk decode time percentiles
+- utterance-to-detection latency (audio position of the chunk that fired,
+  minus the labelled end of the word, plus that chunk's decode time)
+- time spent in the detection actions per recognizer step that fired
+- precision and recall against a labelled manifest
+- rows flushed, controller calls and warnings played by the stubs
+
+Inputs are 16 kHz mono 16-bit WAV files, or raw PCM (.raw/.pcm) in the same
+format. A manifest is a JSON list of recordings with the keywords spoken in
+them; "end" (seconds into the recording) is only needed for latency:
+
+    [
+      {"audio": "clips/kitchen1.wav", "keywords": [{"word": "curse1", "end": 2.4}, "curse2"]},
+      {"audio": "clips/silence.wav", "keywords": []}
+    ]
+
+Comma-separated option values are benchmarked as a grid, e.g.
+
+    python replay_benchmark.py manifest.json --chunk-frames 2000,4000 --mode keywords,full --vad on,off
+"""
+
+import argparse
+import itertools
+import json
+import math
+import os
+import sys
+import time
+import wave
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from vosk import Model, SetLogLevel
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Import the scripts from the scripts directory
+sys.path.append(os.path.join(os.path.dirname(__file__), 'scripts'))
+from detection_pipeline import build_pipeline, pipeline_settings, SAMPLE_RATE
+from detection_actions import make_detection_handler
+from count_store import WordCountStore
+from block_state import BlockStateManager
+from play_audio import PlaybackService
+from unifi_client import resolve_targets
+
+# Detections are attributed to this source name
+REPLAY_SOURCE = "replay"
+
+
+def read_audio(path):
+    """Return the PCM samples of a 16 kHz mono 16-bit WAV or raw PCM file"""
+    if not path.lower().endswith(".wav"):
+        with open(path, "rb") as f:
+            return f.read()
+
+    with wave.open(path, "rb") as wav:
+        if wav.getnchannels() != 1 or wav.getsampwidth() != 2 or wav.getframerate() != SAMPLE_RATE:
+            raise ValueError(f"{path}: expected a {SAMPLE_RATE} Hz mono 16-bit WAV file")
+        return wav.readframes(wav.getnframes())
+
+
+def load_manifest(path):
+    """
+    Load a manifest
+
+    Returns:
+        List of (audio path, [(word, end seconds or None)])
+    """
+    with open(path) as f:
+        entries = json.load(f)
+
+    base = os.path.dirname(os.path.abspath(path))
+    recordings = []
+    for entry in entries:
+        labels = []
+        for keyword in entry.get("keywords", []):
+            if isinstance(keyword, str):
+                labels.append((keyword.lower(), None))
+            else:
+                labels.append((keyword["word"].lower(), keyword.get("end")))
+        recordings.append((os.path.join(base, entry["audio"]), labels))
+    return recordings
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list, or None if it is empty"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class StubConnection:
+    """Database connection that accepts the count store's statements and counts rows"""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def cursor(self):
+        return self
+
+    def execute(self, statement, params=None):
+        self.pool.rows += 1
+
+    def executemany(self, statement, rows):
+        self.pool.rows += len(rows)
+
+    def commit(self):
+        self.pool.commits += 1
+
+    def close(self):
+        pass
+
+
+class StubPool:
+    """Stands in for db_pool.ConnectionPool"""
+
+    def __init__(self):
+        self.rows = 0
+        self.commits = 0
+
+    @contextmanager
+    def connection(self, timeout=None):
+        yield StubConnection(self)
+
+
+class StubClient:
+    """Stands in for unifi_client.UniFiClient, remembering the blocked devices"""
+
+    def __init__(self):
+        self.blocked = set()
+        self.calls = 0
+
+    def block(self, mac):
+        self.calls += 1
+        self.blocked.add(mac)
+
+    def unblock(self, mac):
+        self.calls += 1
+        self.blocked.discard(mac)
+
+    def is_blocked(self, mac):
+        return mac in self.blocked
+
+
+class StubPlayer:
+    """Stands in for the speaker: records the warnings instead of playing them"""
+
+    def __init__(self):
+        self.played = []
+
+    def __call__(self, message, voice, speed, pitch):
+        self.played.append(message)
+        return True
+
+
+class ReplayActions:
+    """
+    The detector's action path on stubs, timing each call and remembering
+    what fired and when
+    """
+
+    def __init__(self):
+        self.pool = StubPool()
+        self.client = StubClient()
+        self.player = StubPlayer()
+        self.counts = WordCountStore(self.pool, source=REPLAY_SOURCE)
+        self.block_states = BlockStateManager(
+            self.client,
+            ttl=int(os.getenv("BLOCK_STATE_TTL", "300")),
+            reconcile_interval=0,
+            debounce=float(os.getenv("BLOCK_DEBOUNCE", "5")))
+        self.playback = PlaybackService(max_queue=int(os.getenv("PLAYBACK_QUEUE_SIZE", "8")),
+                                        volume=None, player=self.player)
+        self.pipelines = {}
+        self.handle_detections = make_detection_handler(
+            self.counts, self.block_states, self.playback,
+            resolve_targets([t.strip() for t in os.getenv("BLOCK_TARGETS", "").split(",") if t.strip()]),
+            warning=os.getenv("CURSE_WORD_WARNING", "You have said a bad word"),
+            pipelines=self.pipelines)
+        self.action_times = []  # seconds spent in handle_detections when something fired
+        self.fed_until = 0.0  # audio seconds fed to the pipeline so far
+        self.detections = []  # (word, audio seconds when available, partial)
+
+    def start(self):
+        self.counts.start()
+        self.playback.start()
+
+    def close(self):
+        """Flush the store and wait for the queued warnings and controller calls"""
+        self.counts.close()
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            devices = self.block_states.snapshot()["devices"].values()
+            audio = self.playback.stats()
+            if not (audio["queue_depth"] or audio["playing"] or any(d["in_flight"] for d in devices)):
+                break
+            time.sleep(0.01)
+
+    def replay_to(self, pipeline):
+        """Send the detections of a fresh pipeline through the actions"""
+        self.pipelines[REPLAY_SOURCE] = pipeline
+        self.fed_until = 0.0
+        self.detections = []
+
+    def __call__(self, final_text, detections):
+        pipeline = self.pipelines[REPLAY_SOURCE]
+        available_at = self.fed_until + pipeline.last_decode_seconds
+        fired = [detection for detection in detections if not detection.confirms]
+        for detection in fired:
+            self.detections.append((detection.word, available_at, detection.partial))
+
+        started = time.perf_counter()
+        self.handle_detections(REPLAY_SOURCE, final_text, detections)
+        if fired:
+            self.action_times.append(time.perf_counter() - started)
+
+    def stats(self):
+        """Return what reached the stubbed database, controller and speaker"""
+        return {
+            "events_written": self.counts.stats()["events_written"],
+            "db_rows": self.pool.rows,
+            "controller_calls": self.client.calls,
+            "warnings_played": len(self.player.played),
+        }
+
+
+def replay(model, words, settings, path, actions):
+    """
+    Replay one recording through a fresh pipeline into the detection actions
+
+    Returns:
+        (audio seconds, wall seconds, per-chunk decode times, pipeline)
+    """
+    pipeline = build_pipeline(model, words, actions, settings, keep_decode_times=True)
+    actions.replay_to(pipeline)
+
+    audio = read_audio(path)
+    chunk_bytes = settings["chunk_frames"] * 2
+    started = time.perf_counter()
+    for offset in range(0, len(audio), chunk_bytes):
+        data = audio[offset:offset + chunk_bytes]
+        actions.fed_until = (offset + len(data)) / 2 / SAMPLE_RATE
+        pipeline.feed(data, actions.fed_until)
+    pipeline.flush()
+    wall = time.perf_counter() - started
+
+    return len(audio) / 2 / SAMPLE_RATE, wall, pipeline.decode_times, pipeline
+
+
+def score(labels, detections):
+    """
+    Compare detections with the labels of one recording
+
+    Returns:
+        (true positives, false positives, false negatives, latencies in seconds)
+    """
+    expected = Counter(word for word, _ in labels)
+    found = Counter(word for word, _, _ in detections)
+    true_pos = sum(min(expected[word], found[word]) for word in expected)
+
+    # Pair labelled occurrences with detections of the same word in order
+    fired = defaultdict(list)
+    for word, available_at, _ in detections:
+        fired[word].append(available_at)
+    latencies = []
+    for word, end in sorted(labels, key=lambda label: label[1] or 0.0):
+        if fired[word]:
+            available_at = fired[word].pop(0)
+            if end is not None:
+                latencies.append(available_at - end)
+
+    return true_pos, sum(found.values()) - true_pos, sum(expected.values()) - true_pos, latencies
+
+
+def run_config(model, words, settings, recordings):
+    """Benchmark one settings combination over all recordings"""
+    audio_seconds = wall_seconds = 0.0
+    decode_times, latencies = [], []
+    true_pos = false_pos = false_neg = 0
+    chunks_in = chunks_decoded = 0
+    labelled = False
+
+    actions = ReplayActions()
+    actions.start()
+    for path, labels in recordings:
+        try:
+            duration, wall, times, pipeline = replay(model, words, settings, path, actions)
+        except (OSError, ValueError) as e:
+            print(f"Skipping {path}: {e}")
+            continue
+
+        audio_seconds += duration
+        wall_seconds += wall
+        decode_times += times
+        chunks_in += pipeline.chunks_in
+        chunks_decoded += pipeline.chunks_decoded
+
+        if labels is not None:
+            labelled = True
+            tp, fp, fn, lat = score(labels, actions.detections)
+            true_pos, false_pos, false_neg = true_pos + tp, false_pos + fp, false_neg + fn
+            latencies += lat
+        print(f"  {os.path.basename(path)}: {[d[0] for d in actions.detections]}")
+    actions.close()
+
+    def ms(value):
+        return None if value is None else round(1000 * value, 1)
+
+    return {
+        "settings": {key: settings[key] for key in
+                     ("chunk_frames", "recognizer_mode", "vad_enabled", "partial_results")},
+        "audio_seconds": round(audio_seconds, 1),
+        "rtf": round(wall_seconds / audio_seconds, 4) if audio_seconds else None,
+        "chunks_in": chunks_in,
+        "chunks_decoded": chunks_decoded,
+        "decode_ms": {"p50": ms(percentile(decode_times, 50)),
+                      "p90": ms(percentile(decode_times, 90)),
+                      "p99": ms(percentile(decode_times, 99)),
+                      "max": ms(max(decode_times) if decode_times else None)},
+        "latency_ms": {"p50": ms(percentile(latencies, 50)),
+                       "p90": ms(percentile(latencies, 90)),
+                       "max": ms(max(latencies) if latencies else None)},
+        "action_ms": {"p50": ms(percentile(actions.action_times, 50)),
+                      "p90": ms(percentile(actions.action_times, 90)),
+                      "max": ms(max(actions.action_times) if actions.action_times else None)},
+        "actions": actions.stats(),
+        "precision": round(true_pos / (true_pos + false_pos), 3)
+        if labelled and true_pos + false_pos else None,
+        "recall": round(true_pos / (true_pos + false_neg), 3)
+        if labelled and true_pos + false_neg else None,
+    }
+
+
+def parse_list(value, convert=str):
+    return [convert(item.strip()) for item in value.split(",") if item.strip()]
+
+
+def on_off(value):
+    if value.lower() not in ("on", "off", "true", "false"):
+        raise ValueError(f"expected on/off, got '{value}'")
+    return value.lower() in ("on", "true")
+
+
+def main():
+    defaults = pipeline_settings()
+    parser = argparse.ArgumentParser(description="Replay recordings through the detection pipeline")
+    parser.add_argument("inputs", nargs="+",
+                        help="Manifest (.json) and/or WAV/raw PCM files without labels")
+    parser.add_argument("--model", default=os.getenv("VOSK_MODEL_PATH", "vosk-model"))
+    parser.add_argument("--words", default=os.getenv("CURSE_WORDS", "curse1,curse2,curse3"))
+    parser.add_argument("--chunk-frames", default=str(defaults["chunk_frames"]))
+    parser.add_argument("--mode", default=defaults["recognizer_mode"])
+    parser.add_argument("--vad", default="on" if defaults["vad_enabled"] else "off")
+    parser.add_argument("--partials", default="on" if defaults["partial_results"] else "off")
+    parser.add_argument("--json", metavar="PATH", help="Also write the results to a JSON file")
+    args = parser.parse_args()
+
+    recordings = []
+    for item in args.inputs:
+        if item.lower().endswith(".json"):
+            recordings += load_manifest(item)
+        else:
+            recordings.append((item, None))
+
+    words = [word.strip() for word in args.words.split(",") if word.strip()]
+    SetLogLevel(-1)
+    model = Model(args.model)
+
+    results = []
+    grid = itertools.product(parse_list(args.chunk_frames, int), parse_list(args.mode),
+                             parse_list(args.vad, on_off), parse_list(args.partials, on_off))
+    for chunk_frames, mode, vad_enabled, partials in grid:
+        settings = dict(defaults, chunk_frames=chunk_frames, recognizer_mode=mode,
+                        vad_enabled=vad_enabled, partial_results=partials)
+        print(f"Benchmarking {settings['chunk_frames']} frames/chunk, {mode} mode, "
+              f"VAD {'on' if vad_enabled else 'off'}, partials {'on' if partials else 'off'}")
+        result = run_config(model, words, settings, recordings)
+        results.append(result)
+        print(f"  RTF {result['rtf']}, decode ms {result['decode_ms']}, "
+              f"latency ms {result['latency_ms']}, action ms {result['action_ms']}, "
+              f"precision {result['precision']}, recall {result['recall']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
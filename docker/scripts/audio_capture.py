@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Audio capture stage for the Raspberry Pi curse word detector.
+
+PortAudio's callback thread copies every captured chunk into a preallocated
+ring buffer, so a slow decode, database commit or print on the recognition
+side never stalls the microphone. The recognition loop consumes chunks from
+the buffer at its own pace.
+
+Several microphones can be captured at once; parse_audio_inputs() and
+find_input_device() map the AUDIO_INPUTS setting to PyAudio devices.
+
+EchoSuppressor lets the recognition side skip chunks captured while the
+detector's own warning was playing through the speaker.
+"""
+
+import threading
+import time
+
+# PortAudio callback status flag and return code (pyaudio.paInputOverflow, pyaudio.paContinue)
+PA_INPUT_OVERFLOW = 0x2
+PA_CONTINUE = 0
+
+
+class RingBuffer:
+    """
+    Fixed-size ring of audio chunks backed by a single preallocated bytearray.
+
+    When the consumer falls behind and the ring is full, the oldest chunk is
+    overwritten so the producer never blocks; every overwrite is counted.
+    """
+
+    def __init__(self, slots, chunk_bytes):
+        self.slots = slots
+        self.chunk_bytes = chunk_bytes
+        self._buffer = bytearray(slots * chunk_bytes)
+        self._view = memoryview(self._buffer)
+        self._lengths = [0] * slots
+        self._timestamps = [0.0] * slots
+        self._head = 0  # next slot to write
+        self._count = 0  # chunks waiting to be read
+        self._closed = False
+        self._cond = threading.Condition()
+
+        # Accounting
+        self.written = 0
+        self.dropped = 0
+        self.high_water = 0
+
+    def put(self, data, timestamp):
+        """Store a chunk, overwriting the oldest one if the ring is full"""
+        size = min(len(data), self.chunk_bytes)
+        with self._cond:
+            if self._count == self.slots:
+                self._count -= 1
+                self.dropped += 1
+
+            start = self._head * self.chunk_bytes
+            self._view[start:start + size] = data[:size]
+            self._lengths[self._head] = size
+            self._timestamps[self._head] = timestamp
+            self._head = (self._head + 1) % self.slots
+
+            self._count += 1
+            self.written += 1
+            if self._count > self.high_water:
+                self.high_water = self._count
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """
+        Remove and return the oldest chunk
+
+        Returns:
+            (data, timestamp) tuple, or None on timeout or after close()
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._count or self._closed, timeout):
+                return None
+            if not self._count:
+                return None
+
+            slot = (self._head - self._count) % self.slots
+            start = slot * self.chunk_bytes
+            data = bytes(self._view[start:start + self._lengths[slot]])
+            self._count -= 1
+            return data, self._timestamps[slot]
+
+    def close(self):
+        """Wake up any waiting consumer"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def __len__(self):
+        return self._count
+
+
+class AudioCapture:
+    """
+    Collects fixed-size chunks from a PyAudio input stream in its callback.
+
+    Open the stream with stream_callback=capture.callback,
+    frames_per_buffer=chunk_frames and start=False, then call start(stream).
+
+    Args:
+        chunk_frames: Frames per chunk (default 4000, i.e. 250 ms at 16 kHz)
+        buffer_chunks: Number of chunks the ring buffer can hold
+        sample_width: Bytes per frame (default 2 for paInt16 mono)
+        name: Name used in log messages
+    """
+
+    def __init__(self, chunk_frames=4000, buffer_chunks=64, sample_width=2, name="audio-capture"):
+        self.name = name
+        self.chunk_frames = chunk_frames
+        self.buffer = RingBuffer(buffer_chunks, chunk_frames * sample_width)
+        self.stream = None
+        self.chunks_captured = 0
+        self.overflows = 0
+
+    def start(self, stream):
+        """Start delivering chunks from stream"""
+        self.stream = stream
+        stream.start_stream()
+
+    def stop(self):
+        """Stop the stream and release the consumer"""
+        if self.stream is not None:
+            self.stream.stop_stream()
+        self.buffer.close()
+
+    def read(self, timeout=None):
+        """Return the next (data, timestamp) chunk, or None on timeout"""
+        return self.buffer.get(timeout)
+
+    def callback(self, in_data, frame_count, time_info, status_flags):
+        """PyAudio stream callback; runs on PortAudio's thread and must stay short"""
+        if status_flags & PA_INPUT_OVERFLOW:
+            # PortAudio discarded input before this callback; the chunk itself is intact
+            self.overflows += 1
+        self.chunks_captured += 1
+        self.buffer.put(in_data, time.monotonic())
+        return None, PA_CONTINUE
+
+    def stats(self):
+        """Return capture and buffer counters"""
+        return {
+            "chunks_captured": self.chunks_captured,
+            "chunks_dropped": self.buffer.dropped,
+            "overflows": self.overflows,
+            "buffered": len(self.buffer),
+            "high_water": self.buffer.high_water,
+            "capacity": self.buffer.slots,
+        }
+
+
+def parse_audio_inputs(value):
+    """
+    Parse an AUDIO_INPUTS setting such as "kitchen=2,living_room=USB Mic"
+
+    Returns:
+        List of (name, device) pairs; device is a PyAudio index or part of a
+        device name, and an entry without "=" is used as both
+    """
+    inputs = []
+    for entry in value.split(","):
+        if not entry.strip():
+            continue
+        name, _, device = entry.partition("=")
+        inputs.append((name.strip(), (device or name).strip()))
+    return inputs
+
+
+def find_input_device(pa, device):
+    """
+    Resolve a device setting to a PyAudio input device index
+
+    Args:
+        pa: pyaudio.PyAudio instance
+        device: Device index, part of a device name, or None for the default input
+
+    Returns:
+        Device index, or None for the default input
+    """
+    if not device:
+        return None
+    if device.isdigit():
+        return int(device)
+    for index in range(pa.get_device_count()):
+        info = pa.get_device_info_by_index(index)
+        if info.get("maxInputChannels", 0) > 0 and device.lower() in info.get("name", "").lower():
+            return index
+    raise ValueError(f"No audio input device matching '{device}'")
+
+
+class EchoSuppressor:
+    """
+    Drops captured chunks that overlap the system's own warning playback.
+
+    Args:
+        tracker: play_audio.PlaybackTracker publishing playback intervals
+        chunk_seconds: Duration of one captured chunk
+        guard_seconds: Extra margin around each playback
+    """
+
+    def __init__(self, tracker, chunk_seconds, guard_seconds=0.3):
+        self.tracker = tracker
+        self.chunk_seconds = chunk_seconds
+        self.guard_seconds = guard_seconds
+        self.suppressed = 0
+
+    def should_skip(self, timestamp):
+        """True if the chunk captured at timestamp (its end) overlaps playback"""
+        if self.tracker.overlaps(timestamp - self.chunk_seconds, timestamp, self.guard_seconds):
+            self.suppressed += 1
+            return True
+        return False
+
+    def stats(self):
+        """Return the suppressed chunk counter"""
+        return {"suppressed_chunks": self.suppressed}
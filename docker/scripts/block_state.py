@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Block-state cache and action debouncer for the Raspberry Pi curse word detector.
+
+Remembers whether each MAC is blocked on the controller. A burst of
+detections for the same device within a short debounce window costs one
+controller call, but a detection after that always re-sends the block, since
+a parent may have unblocked the device from the UniFi UI in the meantime.
+Concurrent requests for the same device collapse into a single in-flight
+controller call, which runs on a small fixed worker pool instead of a new
+thread per detection. A reconciliation thread periodically refreshes the
+cached states from the controller.
+"""
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from metrics import Histogram
+
+
+class BlockStateManager:
+    """
+    Tracks and changes the blocked state of devices through a UniFiClient.
+
+    Args:
+        client: unifi_client.UniFiClient
+        ttl: Seconds a cached state is trusted for unblock requests
+        reconcile_interval: Seconds between refreshes of all known devices
+            (0 disables, capped at ttl)
+        workers: Size of the worker pool for controller calls
+        debounce: Seconds after a confirmed block during which further block
+            requests for the device are not sent again
+    """
+
+    def __init__(self, client, ttl=300, reconcile_interval=300, workers=2, debounce=5):
+        self.client = client
+        self.ttl = ttl
+        self.debounce = debounce
+        self.reconcile_interval = min(reconcile_interval, ttl) if reconcile_interval else 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="block-state")
+        self._lock = threading.Lock()
+        self._states = {}  # mac -> {"blocked", "updated", "error"}
+        self._in_flight = {}  # mac -> (blocked, Future) of the latest call
+        self._reconciler = None
+
+        # Accounting
+        self.calls = 0
+        self.failures = 0
+        self.cache_hits = 0
+        self.collapsed = 0
+        self.call_latency = Histogram()
+
+    def start(self):
+        """Start periodic reconciliation with the controller"""
+        if self.reconcile_interval and self._reconciler is None:
+            self._reconciler = threading.Thread(target=self._reconcile_loop,
+                                                name="block-reconcile", daemon=True)
+            self._reconciler.start()
+
+    def request_block(self, mac):
+        """Make sure a device is blocked; returns a Future resolving to success"""
+        return self._request(mac.lower(), True)
+
+    def request_unblock(self, mac):
+        """Make sure a device is unblocked; returns a Future resolving to success"""
+        return self._request(mac.lower(), False)
+
+    def _request(self, mac, blocked):
+        # Blocks are only skipped within the debounce window, so a device
+        # unblocked from the controller UI is blocked again on the next detection
+        trusted_for = self.debounce if blocked else self.ttl
+        with self._lock:
+            state = self._states.get(mac)
+            if (state is not None and state["blocked"] == blocked
+                    and time.monotonic() - state["updated"] < trusted_for):
+                self.cache_hits += 1
+                done = Future()
+                done.set_result(True)
+                return done
+
+            in_flight = self._in_flight.get(mac)
+            if in_flight is not None and in_flight[0] == blocked:
+                self.collapsed += 1
+                return in_flight[1]
+
+            entry = (blocked, Future())
+            self._in_flight[mac] = entry
+        self._executor.submit(self._apply, mac, entry)
+        return entry[1]
+
+    def _apply(self, mac, entry):
+        blocked, future = entry
+        action = "block" if blocked else "unblock"
+        started = time.monotonic()
+        try:
+            self.calls += 1
+            if blocked:
+                self.client.block(mac)
+            else:
+                self.client.unblock(mac)
+        except Exception as e:
+            self.call_latency.observe(time.monotonic() - started)
+            self.failures += 1
+            print(f"Failed to {action} device {mac}: {e}")
+            with self._lock:
+                self._states.setdefault(mac, {"blocked": None, "updated": 0.0})["error"] = str(e)
+                self._finish(mac, entry)
+            future.set_result(False)
+            return
+
+        self.call_latency.observe(time.monotonic() - started)
+        print(f"Device {mac} {action}ed")
+        with self._lock:
+            self._states[mac] = {"blocked": blocked, "updated": time.monotonic(), "error": None}
+            self._finish(mac, entry)
+        future.set_result(True)
+
+    def _finish(self, mac, entry):
+        # A newer request in the other direction may have replaced this call
+        if self._in_flight.get(mac) is entry:
+            del self._in_flight[mac]
+
+    def _set_state(self, mac, blocked):
+        with self._lock:
+            self._states[mac] = {"blocked": blocked, "updated": time.monotonic(), "error": None}
+
+    def reconcile(self):
+        """Refresh the cached state of every known device from the controller"""
+        with self._lock:
+            macs = [mac for mac in self._states if mac not in self._in_flight]
+        for mac in macs:
+            try:
+                self._set_state(mac, self.client.is_blocked(mac))
+            except Exception as e:
+                print(f"Failed to reconcile block state of {mac}: {e}")
+
+    def _reconcile_loop(self):
+        while True:
+            time.sleep(self.reconcile_interval)
+            self.reconcile()
+
+    def snapshot(self):
+        """Return cached states and counters for the health endpoint"""
+        now = time.monotonic()
+        with self._lock:
+            devices = {
+                mac: {
+                    "blocked": state["blocked"],
+                    "age_seconds": round(now - state["updated"], 1) if state["updated"] else None,
+                    "in_flight": mac in self._in_flight,
+                    "last_error": state.get("error"),
+                }
+                for mac, state in self._states.items()
+            }
+        return {
+            "devices": devices,
+            "calls": self.calls,
+            "failures": self.failures,
+            "cache_hits": self.cache_hits,
+            "collapsed": self.collapsed,
+            "call_latency": self.call_latency.snapshot(),
+        }
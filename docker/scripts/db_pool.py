@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Small database connection pool for the Raspberry Pi curse word detector.
+
+Works with both mysql.connector and the mariadb connector. Connections are
+health-checked before use when they have been idle, dropped when a query on
+them fails, and re-established with exponential backoff, so a database
+restart or an overnight idle timeout no longer kills the detector.
+"""
+
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+DRIVERS = ("mysql", "mariadb")
+
+
+def make_connect(driver, host, user, password, database, timeout=10):
+    """
+    Build a connect() callable for the given driver
+
+    Args:
+        driver: "mysql" for mysql.connector or "mariadb"
+        timeout: Connect and per-query timeout in seconds
+
+    Returns:
+        Function returning a new connection with the query timeout applied
+    """
+    if driver == "mariadb":
+        import mariadb
+
+        def connect():
+            conn = mariadb.connect(host=host, user=user, password=password, database=database,
+                                   connect_timeout=timeout, read_timeout=timeout,
+                                   write_timeout=timeout)
+            _set_statement_timeout(conn, "SET SESSION max_statement_time = %s" % float(timeout))
+            return conn
+    elif driver == "mysql":
+        import mysql.connector
+
+        def connect():
+            # connection_timeout also bounds every socket read of the pure Python driver
+            conn = mysql.connector.connect(host=host, user=user, password=password,
+                                           database=database, connection_timeout=timeout)
+            _set_statement_timeout(conn, "SET SESSION max_execution_time = %d" % (timeout * 1000))
+            return conn
+    else:
+        raise ValueError(f"Unknown database driver '{driver}', expected one of {DRIVERS}")
+    return connect
+
+
+def _set_statement_timeout(conn, statement):
+    # Server-side limit on statement run time; not every server version knows it
+    try:
+        cursor = conn.cursor()
+        cursor.execute(statement)
+        cursor.close()
+    except Exception:
+        pass
+
+
+class ConnectionPool:
+    """
+    Fixed-size pool of database connections.
+
+    Args:
+        connect: Callable returning a new connection (see make_connect)
+        size: Maximum number of open connections
+        ping_interval: Idle seconds after which a connection is pinged before use
+        retries: Connection attempts before giving up
+        backoff: Initial delay between attempts, doubled after each failure
+        max_backoff: Upper bound for the delay between attempts
+    """
+
+    def __init__(self, connect, size=2, ping_interval=30, retries=5, backoff=1.0, max_backoff=30.0):
+        self._connect = connect
+        self.size = size
+        self.ping_interval = ping_interval
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+        # Accounting
+        self.connects = 0
+        self.connect_failures = 0
+        self.discarded = 0
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """
+        Borrow a healthy connection
+
+        The connection is returned to the pool when the block exits normally
+        and discarded if the block raises, so the next borrower reconnects.
+        """
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError("Timed out waiting for a database connection")
+        conn = None
+        try:
+            conn = self._checkout()
+            yield conn
+        except Exception:
+            if conn is not None:
+                self._discard(conn)
+                conn = None
+            raise
+        finally:
+            if conn is not None:
+                self._idle.put((conn, time.monotonic()))
+            self._slots.release()
+
+    def _checkout(self):
+        while True:
+            try:
+                conn, idle_since = self._idle.get_nowait()
+            except queue.Empty:
+                return self._open()
+            if time.monotonic() - idle_since < self.ping_interval or self._is_alive(conn):
+                return conn
+            self._discard(conn)
+
+    def _is_alive(self, conn):
+        try:
+            conn.ping()
+            return True
+        except Exception:
+            return False
+
+    def _open(self):
+        delay = self.backoff
+        for attempt in range(1, self.retries + 1):
+            try:
+                conn = self._connect()
+                self.connects += 1
+                return conn
+            except Exception as e:
+                self.connect_failures += 1
+                print(f"Database connection attempt {attempt}/{self.retries} failed: {e}")
+                if attempt == self.retries:
+                    raise
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+
+    def _discard(self, conn):
+        self.discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close(self):
+        """Close all idle connections"""
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(conn)
+
+    def stats(self):
+        """Return pool counters"""
+        return {
+            "idle": self._idle.qsize(),
+            "connects": self.connects,
+            "connect_failures": self.connect_failures,
+            "discarded": self.discarded,
+        }
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Actions the Raspberry Pi curse word detector takes on a detection.
+
+Every detection is counted in the write-behind WordCountStore, the
+configured devices are blocked through the BlockStateManager and a warning
+is queued on the PlaybackService. curse_word_detector.py builds the handler
+with the live database pool, UniFi client and speaker; replay_benchmark.py
+builds it with stubs, so both run the same action path.
+"""
+
+from collections import Counter
+
+
+def make_detection_handler(counts, block_states, playback, block_targets, warning, pipelines,
+                           source_detections=None, word_detections=None):
+    """
+    Build the on_detections callback shared by every source
+
+    Args:
+        counts: count_store.WordCountStore
+        block_states: block_state.BlockStateManager
+        playback: play_audio.PlaybackService
+        block_targets: Device MACs to block on a detection
+        warning: Message queued for playback on a detection
+        pipelines: Dict of source name -> detection pipeline, read when an
+            utterance ends without a detection
+        source_detections: Counter of detections per source, updated in place
+        word_detections: Counter of detections per (source, word), updated in place
+
+    Returns:
+        handle_detections(source, final_text, detections)
+    """
+    source_detections = Counter() if source_detections is None else source_detections
+    word_detections = Counter() if word_detections is None else word_detections
+
+    # Act on the detections from one recognizer step of a source
+    def handle_detections(source, final_text, detections):
+        # Hits already acted on from a partial result only bring their confidence
+        for detection in detections:
+            if detection.confirms:
+                counts.confirm(detection.word, detection.confidence, source=source)
+        detections = [detection for detection in detections if not detection.confirms]
+
+        if detections:
+            source_detections[source] += len(detections)
+            for detection in detections:
+                word_detections[(source, detection.word)] += 1
+                count = counts.record(detection.word, confidence=detection.confidence, source=source,
+                                      provisional=detection.partial)
+                print(f"Detected curse word in {source}: {detection.word} ({detection.path} match), count {count}")
+
+            # Block the devices when curse word detected (concurrently, one session)
+            for mac in block_targets:
+                block_states.request_block(mac)
+
+            # Play warning message through speakers
+            playback.enqueue(warning)
+        elif final_text is not None and not pipelines[source].last_utterance_hits:
+            print(f"No curse word detected in {source}.")
+
+    return handle_detections
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Detection pipeline for the Raspberry Pi curse word detector.
+
+Chains the stages between the audio source and the actions: echo
+suppression, the voice activity gate, the speech recognizer and the keyword
+matcher. The live detector feeds it microphone chunks and replay_benchmark.py
+feeds it chunks read from recordings, so both exercise the same code.
+"""
+
+import os
+import time
+
+from audio_capture import EchoSuppressor
+from keyword_matcher import KeywordMatcher
+from metrics import Histogram, DECODE_BUCKETS
+from recognition import create_recognizer, KeywordStream
+from vad import VoiceActivityGate
+
+SAMPLE_RATE = 16000
+
+
+def pipeline_settings():
+    """Return the pipeline settings from the environment"""
+    return {
+        "recognizer_mode": os.getenv("RECOGNIZER_MODE", "keywords").lower(),
+        "phonetic_matching": os.getenv("PHONETIC_MATCHING", "off").lower(),
+        "phonetic_min_length": int(os.getenv("PHONETIC_MIN_LENGTH", "3")),
+        "phonetic_allow_words": [w.strip() for w in os.getenv("PHONETIC_ALLOW_WORDS", "").split(",") if w.strip()],
+        "partial_results": os.getenv("PARTIAL_RESULTS", "false").lower() == "true",
+        "partial_stability": int(os.getenv("PARTIAL_STABILITY", "2")),
+        "chunk_frames": int(os.getenv("AUDIO_CHUNK_FRAMES", "4000")),
+        "vad_enabled": os.getenv("VAD_ENABLED", "true").lower() == "true",
+        "vad_energy_margin_db": float(os.getenv("VAD_ENERGY_MARGIN_DB", "10")),
+        "vad_hangover_ms": int(os.getenv("VAD_HANGOVER_MS", "1000")),
+        "vad_preroll_ms": int(os.getenv("VAD_PREROLL_MS", "500")),
+        "echo_suppression": os.getenv("ECHO_SUPPRESSION", "true").lower() == "true",
+        "echo_guard_ms": int(os.getenv("ECHO_GUARD_MS", "300")),
+    }
+
+
+class DetectionPipeline:
+    """
+    Runs captured chunks through echo guard, VAD and recognizer.
+
+    Args:
+        keyword_stream: recognition.KeywordStream
+        on_detections: Called with (final_text, detections) after every
+            recognizer step; self.captured_at holds the timestamp of the chunk
+        vad: Optional vad.VoiceActivityGate
+        echo_guard: Optional audio_capture.EchoSuppressor
+        keep_decode_times: Keep every per-chunk decode time in decode_times
+    """
+
+    def __init__(self, keyword_stream, on_detections, vad=None, echo_guard=None,
+                 keep_decode_times=False):
+        self.keyword_stream = keyword_stream
+        self.on_detections = on_detections
+        self.vad = vad
+        self.echo_guard = echo_guard
+        self.decode_times = [] if keep_decode_times else None
+        self.captured_at = None
+
+        # Accounting
+        self.chunks_in = 0
+        self.chunks_decoded = 0
+        self.decode_seconds = 0.0
+        self.last_decode_seconds = 0.0
+        self.audio_seconds = 0.0  # audio that reached the recognizer
+        self.decode_histogram = Histogram(DECODE_BUCKETS)
+
+    @property
+    def last_utterance_hits(self):
+        """Keywords detected in the last finished utterance"""
+        return self.keyword_stream.last_utterance_hits
+
+    def feed(self, data, captured_at):
+        """Run one captured chunk through the pipeline"""
+        self.chunks_in += 1
+        if self.echo_guard and self.echo_guard.should_skip(captured_at):
+            return
+
+        chunks = self.vad.process(data, captured_at) if self.vad else [(data, captured_at)]
+        for data, captured_at in chunks:
+            started = time.perf_counter()
+            final_text, detections = self.keyword_stream.accept(data)
+            self._decoded(time.perf_counter() - started, captured_at)
+            self.audio_seconds += len(data) / 2 / SAMPLE_RATE
+            self.on_detections(final_text, detections)
+
+    def flush(self):
+        """Finish the pending utterance, e.g. at the end of a recording"""
+        started = time.perf_counter()
+        final_text, detections = self.keyword_stream.flush()
+        self._decoded(time.perf_counter() - started, self.captured_at)
+        self.on_detections(final_text, detections)
+
+    def _decoded(self, elapsed, captured_at):
+        self.chunks_decoded += 1
+        self.decode_seconds += elapsed
+        self.last_decode_seconds = elapsed
+        self.decode_histogram.observe(elapsed)
+        if self.decode_times is not None:
+            self.decode_times.append(elapsed)
+        self.captured_at = captured_at
+
+    def stats(self):
+        """Return chunk and decode time counters"""
+        return {
+            "chunks_in": self.chunks_in,
+            "chunks_decoded": self.chunks_decoded,
+            "decode_seconds": round(self.decode_seconds, 3),
+            "avg_decode_ms": round(1000 * self.decode_seconds / self.chunks_decoded, 2)
+            if self.chunks_decoded else None,
+            "audio_seconds": round(self.audio_seconds, 2),
+            "rtf": round(self.decode_seconds / self.audio_seconds, 4) if self.audio_seconds else None,
+            "decode_histogram": self.decode_histogram.snapshot(),
+        }
+
+
+def build_pipeline(model, words, on_detections, settings=None, tracker=None,
+                   keep_decode_times=False):
+    """
+    Build a DetectionPipeline
+
+    Args:
+        model: Loaded vosk.Model
+        words: Curse words to detect
+        on_detections: Detection callback, see DetectionPipeline
+        settings: Settings dict (defaults to pipeline_settings())
+        tracker: play_audio.PlaybackTracker; enables echo suppression when given
+        keep_decode_times: Keep every per-chunk decode time
+
+    Returns:
+        DetectionPipeline instance
+    """
+    if settings is None:
+        settings = pipeline_settings()
+
+    # Decode against a grammar of the curse words unless full vocabulary is configured
+    recognizer = create_recognizer(model, SAMPLE_RATE, words, mode=settings["recognizer_mode"])
+
+    # Compile the curse word list once into a whole-token matcher, optionally
+    # backed by a phonetic index for words the recognizer misheard
+    matcher = KeywordMatcher(words, phonetic=settings["phonetic_matching"],
+                             phonetic_min_length=settings["phonetic_min_length"],
+                             phonetic_allow_words=settings["phonetic_allow_words"])
+
+    # Fire on stable partial hypotheses instead of waiting for the end of the utterance
+    keyword_stream = KeywordStream(recognizer, matcher.match,
+                                   use_partials=settings["partial_results"],
+                                   partial_stability=settings["partial_stability"])
+
+    # Only speech (plus a short lead-in and tail) reaches the recognizer
+    vad = VoiceActivityGate(
+        sample_rate=SAMPLE_RATE,
+        energy_margin_db=settings["vad_energy_margin_db"],
+        hangover_ms=settings["vad_hangover_ms"],
+        preroll_ms=settings["vad_preroll_ms"]
+    ) if settings["vad_enabled"] else None
+
+    # Ignore the microphone while our own warning plays through the speaker
+    echo_guard = EchoSuppressor(
+        tracker,
+        chunk_seconds=settings["chunk_frames"] / SAMPLE_RATE,
+        guard_seconds=settings["echo_guard_ms"] / 1000
+    ) if tracker is not None and settings["echo_suppression"] else None
+
+    return DetectionPipeline(keyword_stream, on_detections, vad=vad, echo_guard=echo_guard,
+                             keep_decode_times=keep_decode_times)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Compact UDP heartbeat shared by health_check.py (sender) and pi_monitor.py (listener).
+
+A heartbeat is one signed datagram of about 60 bytes plus the node name:
+
+    magic "PH" | version | flags | epoch | seq | sent_at | name length | name
+    | health digest | HMAC-SHA256 (first 16 bytes)
+
+The epoch is picked at random when the sender starts and the sequence number
+counts up from 1, so the listener can tell restarts from replays and count
+lost datagrams. Both sides share HEARTBEAT_KEY; datagrams with a bad
+signature are dropped.
+"""
+
+import hashlib
+import hmac
+import math
+import struct
+import time
+from collections import deque
+
+MAGIC = b"PH"
+VERSION = 1
+MAC_SIZE = 16
+
+HEADER = struct.Struct("!2sBBIIdB")
+# alive, status_age, rtf, capture_queue, decode_backlog, db_queue, playback_queue
+DIGEST = struct.Struct("!BffHHIH")
+DIGEST_FIELDS = ("alive", "status_age", "rtf", "capture_queue", "decode_backlog",
+                 "db_queue", "playback_queue")
+
+# Sequence numbers further behind the newest one than this are rejected
+REPLAY_WINDOW = 64
+# Earlier epochs of a sender remembered, so their datagrams cannot be replayed
+RETIRED_EPOCHS = 16
+
+
+def _float(value):
+    return math.nan if value is None else float(value)
+
+
+def _count(value, limit):
+    return min(max(int(value or 0), 0), limit)
+
+
+def encode(key, node, epoch, seq, digest, sent_at=None):
+    """
+    Build a signed heartbeat datagram
+
+    Args:
+        key: Shared secret (bytes)
+        node: Sender name, at most 255 bytes of UTF-8
+        epoch: Random number fixed for the sender's lifetime
+        seq: Sequence number, incremented for every datagram
+        digest: Dict with the DIGEST_FIELDS keys; missing values are sent as unknown
+        sent_at: Send time, defaults to now
+
+    Returns:
+        Datagram bytes
+    """
+    name = node.encode()[:255]
+    body = HEADER.pack(MAGIC, VERSION, 0, epoch & 0xFFFFFFFF, seq & 0xFFFFFFFF,
+                       time.time() if sent_at is None else sent_at, len(name)) + name
+    body += DIGEST.pack(
+        1 if digest.get("alive") else 0,
+        _float(digest.get("status_age")),
+        _float(digest.get("rtf")),
+        _count(digest.get("capture_queue"), 0xFFFF),
+        _count(digest.get("decode_backlog"), 0xFFFF),
+        _count(digest.get("db_queue"), 0xFFFFFFFF),
+        _count(digest.get("playback_queue"), 0xFFFF),
+    )
+    return body + hmac.new(key, body, hashlib.sha256).digest()[:MAC_SIZE]
+
+
+def decode(key, data):
+    """
+    Verify and parse a heartbeat datagram
+
+    Returns:
+        {"node", "epoch", "seq", "sent_at", "digest"}; unknown digest values are None
+
+    Raises:
+        ValueError: If the datagram is malformed or its signature is wrong
+    """
+    if len(data) < HEADER.size + DIGEST.size + MAC_SIZE:
+        raise ValueError("Heartbeat too short")
+    body, mac = data[:-MAC_SIZE], data[-MAC_SIZE:]
+    if not hmac.compare_digest(mac, hmac.new(key, body, hashlib.sha256).digest()[:MAC_SIZE]):
+        raise ValueError("Bad heartbeat signature")
+
+    magic, version, _, epoch, seq, sent_at, name_length = HEADER.unpack_from(body)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Unsupported heartbeat version {version}")
+    if len(body) != HEADER.size + name_length + DIGEST.size:
+        raise ValueError("Bad heartbeat length")
+    name = body[HEADER.size:HEADER.size + name_length].decode(errors="replace")
+
+    values = DIGEST.unpack_from(body, HEADER.size + name_length)
+    digest = dict(zip(DIGEST_FIELDS, values))
+    digest["alive"] = bool(digest["alive"])
+    for field in ("status_age", "rtf"):
+        if math.isnan(digest[field]):
+            digest[field] = None
+        else:
+            digest[field] = round(digest[field], 4)
+    return {"node": name, "epoch": epoch, "seq": seq, "sent_at": sent_at, "digest": digest}
+
+
+class SequenceTracker:
+    """
+    Counts received, lost, duplicate and reordered heartbeats of one sender.
+
+    Uses a sliding window of recently seen sequence numbers, as IPsec does
+    against replays, so duplicates are rejected and late datagrams that fill
+    a gap are no longer counted as lost.
+
+    A new epoch (a restarted sender) resets the window, but only once the
+    current epoch has been silent for switch_after seconds: a restarting
+    sender stops sending anyway, while a replayed datagram of another epoch
+    cannot take over from a live one. Epochs already left behind are refused,
+    so no clock agreement between sender and listener is needed.
+
+    Args:
+        switch_after: Seconds of silence after which a new epoch is accepted,
+            a few of the sender's heartbeat intervals
+    """
+
+    def __init__(self, switch_after=3.0):
+        self.switch_after = switch_after
+        self.epoch = None
+        self.retired = deque(maxlen=RETIRED_EPOCHS)
+        self.last_accepted = None  # time.monotonic() of the last accepted datagram
+        self.restarts = 0
+        self.received = 0
+        self.duplicates = 0
+        self.reordered = 0
+        self.foreign = 0  # other epochs refused while the current one is live
+        self._first = None
+        self._highest = None
+        self._window = 0
+        self._received_in_epoch = 0
+        self._lost_before = 0  # lost in earlier epochs
+        self._expected_before = 0
+
+    def accept(self, epoch, seq, now=None):
+        """
+        Record a datagram
+
+        Args:
+            now: time.monotonic() of its arrival, defaults to now
+
+        Returns:
+            True if it is new, False for a duplicate, a replay, a retired
+            epoch or another epoch while the current one is live
+        """
+        now = time.monotonic() if now is None else now
+        if epoch != self.epoch:
+            # A restarted sender picks a new random epoch; a replayed datagram
+            # from an earlier one must not switch back to it
+            if epoch in self.retired:
+                self.duplicates += 1
+                return False
+            if self.epoch is not None and now - self.last_accepted < self.switch_after:
+                self.foreign += 1
+                return False
+            if self.epoch is not None:
+                self.retired.append(self.epoch)
+                self.restarts += 1
+                self._expected_before += self._expected()
+                self._lost_before += self._expected() - self._received_in_epoch
+            self.epoch = epoch
+            self._first = self._highest = seq
+            self._window = 1
+            self._received_in_epoch = 1
+        elif seq > self._highest:
+            self._window = ((self._window << (seq - self._highest)) | 1) & ((1 << REPLAY_WINDOW) - 1)
+            self._highest = seq
+            self._received_in_epoch += 1
+        else:
+            offset = self._highest - seq
+            if offset >= REPLAY_WINDOW or self._window & (1 << offset):
+                self.duplicates += 1
+                return False
+            self._window |= 1 << offset
+            self.reordered += 1
+            self._received_in_epoch += 1
+        self.received += 1
+        self.last_accepted = now
+        return True
+
+    def _expected(self):
+        return self._highest - self._first + 1 if self._highest is not None else 0
+
+    def stats(self):
+        """Return counters and the loss ratio"""
+        expected = self._expected_before + self._expected()
+        lost = self._lost_before + self._expected() - self._received_in_epoch
+        return {
+            "received": self.received,
+            "lost": lost,
+            "loss_ratio": round(lost / expected, 4) if expected else None,
+            "duplicates": self.duplicates,
+            "reordered": self.reordered,
+            "restarts": self.restarts,
+            "foreign": self.foreign,
+            "seq": self._highest,
+        }
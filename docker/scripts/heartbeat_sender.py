@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Scheduling and bookkeeping for the heartbeats health_check.py sends to the monitors.
+
+Heartbeats tick on a monotonic deadline, so the time spent sending does not
+stretch the interval, and each tick is shifted by a little random jitter so
+that many Pis started together do not hit the monitor in lockstep.
+"""
+
+import random
+import time
+
+from metrics import Histogram, LATENCY_BUCKETS
+
+
+def parse_monitors(value, default_port):
+    """
+    Parse a MONITORS setting such as "192.168.1.2:5000,192.168.1.3"
+
+    Returns:
+        List of (host, port) pairs
+    """
+    monitors = []
+    for entry in value.split(","):
+        if not entry.strip():
+            continue
+        host, _, port = entry.strip().partition(":")
+        monitors.append((host, int(port or default_port)))
+    return monitors
+
+
+class Ticker:
+    """
+    Fires every interval seconds on a schedule that does not drift.
+
+    Args:
+        interval: Seconds between ticks
+        jitter: Each tick is moved by up to this fraction of the interval,
+            without shifting the ticks after it
+    """
+
+    def __init__(self, interval, jitter=0.1):
+        self.interval = interval
+        self.jitter = jitter
+        self.missed = 0
+        self._deadline = time.monotonic()
+
+    def wait(self):
+        """Sleep until the next tick"""
+        self._deadline += self.interval
+        now = time.monotonic()
+        if now > self._deadline:
+            # Fell behind (slow send, suspended system): skip the missed ticks instead of bursting
+            missed = int((now - self._deadline) // self.interval) + 1
+            self.missed += missed
+            self._deadline += missed * self.interval
+        offset = random.uniform(-self.jitter, self.jitter) * self.interval
+        time.sleep(max(0.0, self._deadline + offset - time.monotonic()))
+
+
+class HeartbeatStats:
+    """Latency and failure counters for heartbeats to one monitor"""
+
+    def __init__(self):
+        self.sent = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_success = None
+        self.last_error = None
+        self.last_latency = None
+        self.latency = Histogram(LATENCY_BUCKETS)
+
+    def success(self, latency=None):
+        """Record a delivered heartbeat and its round trip time in seconds"""
+        self.sent += 1
+        self.consecutive_failures = 0
+        self.last_success = time.time()
+        if latency is not None:
+            self.last_latency = latency
+            self.latency.observe(latency)
+
+    def failure(self, error):
+        """Record a heartbeat that could not be delivered"""
+        self.sent += 1
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.last_error = str(error)
+
+    def snapshot(self):
+        """Return the counters for the /check endpoint"""
+        latency = self.latency.snapshot()
+        return {
+            "sent": self.sent,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "last_success": self.last_success,
+            "last_error": self.last_error,
+            "last_latency_ms": round(self.last_latency * 1000, 1) if self.last_latency is not None else None,
+            "avg_latency_ms": round(1000 * latency["sum"] / latency["count"], 1) if latency["count"] else None,
+            "latency": latency,
+        }
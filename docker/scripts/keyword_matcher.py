@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Keyword matcher for the Raspberry Pi curse word detector.
+
+The matcher is compiled once at startup from CURSE_WORDS. Transcripts are
+scanned token by token in a single pass: single-word terms are found with a
+hash lookup, multi-word phrases with an Aho-Corasick automaton over tokens.
+Matching whole tokens means a term never fires inside an innocent word.
+
+Optionally, tokens that are not an exact hit are looked up in a phonetic
+index (Metaphone or Soundex keys of each word and its common inflections),
+so a word the small Vosk model transcribed as a similar-sounding word is
+still caught with a single hash lookup. A phonetic hit must also start with
+the same letter as the indexed variant and be within one letter of its
+length, and common words that happen to share a key ("hello" and "hell")
+are never matched phonetically.
+"""
+
+from collections import namedtuple
+
+# A matched term, its token span [start, end) in the transcript and whether
+# it matched "exact"ly or through the "phonetic" index
+Match = namedtuple("Match", ["term", "start", "end", "path"])
+
+PHONETIC_MODES = ("off", "strict", "loose")
+VOWELS = "AEIOU"
+
+# Everyday words never matched phonetically, whatever key they share
+COMMON_WORDS = frozenset("""
+    about after again all also and any are back bad bed bet better big bit but
+    buck buddy bus call came can car cat come could dad day did dig dish do dock
+    does dog done duck each fact far fast feel fit for fork fox from fun funny
+    get girl give good guess had hall has have he heal hear heard hello help
+    her here hey hi hill him his hold hole home how hull if into is it its just
+    kid kids kind know let like look made make man many may me mom more most
+    much must my new nice nine no not now of off okay old on one only or other
+    our out over pass pick piece play please pretty put said same saw say see
+    she shed shell ship shoot shot shut sit so some sorry stop such sure take
+    tell than thank that the their them then there these they thing think this
+    time to too two up us use very want was way we well went were what when
+    where which while who whole why will wish with word work would yeah yes yet
+    you your
+""".split())
+
+
+def normalize(text):
+    """Lower-case a term or transcript and collapse whitespace"""
+    return " ".join(text.lower().split())
+
+
+def metaphone(word):
+    """Return the Metaphone key of a word (original Philips rules, simplified)"""
+    word = "".join(c for c in word.upper() if c.isalpha())
+    if not word:
+        return ""
+
+    # Initial letter exceptions
+    if word[:2] in ("AE", "GN", "KN", "PN", "WR"):
+        word = word[1:]
+    elif word[0] == "X":
+        word = "S" + word[1:]
+    elif word[:2] == "WH":
+        word = "W" + word[2:]
+
+    key = []
+    length = len(word)
+    for i, c in enumerate(word):
+        prev = word[i - 1] if i > 0 else ""
+        nxt = word[i + 1] if i + 1 < length else ""
+        nxt2 = word[i + 2] if i + 2 < length else ""
+
+        # Skip doubled letters except C
+        if c == prev and c != "C":
+            continue
+
+        if c in VOWELS:
+            if i == 0:
+                key.append(c)
+        elif c == "B":
+            if not (prev == "M" and i == length - 1):
+                key.append("B")
+        elif c == "C":
+            if nxt == "I" and nxt2 == "A":
+                key.append("X")
+            elif nxt == "H":
+                key.append("K" if prev == "S" else "X")
+            elif nxt in "IEY" and nxt:
+                if prev != "S":
+                    key.append("S")
+            else:
+                key.append("K")
+        elif c == "D":
+            key.append("J" if nxt == "G" and nxt2 in "EIY" and nxt2 else "T")
+        elif c == "G":
+            if nxt == "H" and not (i + 2 >= length or nxt2 in VOWELS):
+                continue
+            if nxt == "N" and (i + 2 == length or word[i + 1:] == "NED"):
+                continue
+            if prev == "D" and nxt in "EIY" and nxt:
+                continue
+            key.append("J" if nxt in "EIY" and nxt and prev != "G" else "K")
+        elif c == "H":
+            if prev in "CSPTG" and prev:
+                continue
+            if prev in VOWELS and prev and nxt not in VOWELS:
+                continue
+            key.append("H")
+        elif c == "K":
+            if prev != "C":
+                key.append("K")
+        elif c == "P":
+            key.append("F" if nxt == "H" else "P")
+        elif c == "Q":
+            key.append("K")
+        elif c == "S":
+            if nxt == "H" or (nxt == "I" and nxt2 in ("O", "A")):
+                key.append("X")
+            else:
+                key.append("S")
+        elif c == "T":
+            if nxt == "I" and nxt2 in ("O", "A"):
+                key.append("X")
+            elif nxt == "H":
+                key.append("0")
+            elif not (nxt == "C" and nxt2 == "H"):
+                key.append("T")
+        elif c == "V":
+            key.append("F")
+        elif c in "WY":
+            if nxt in VOWELS and nxt:
+                key.append(c)
+        elif c == "X":
+            key.append("KS")
+        elif c == "Z":
+            key.append("S")
+        else:
+            key.append(c)
+    return "".join(key)
+
+
+SOUNDEX_CODES = {}
+for _letters, _code in (("BFPV", "1"), ("CGJKQSXZ", "2"), ("DT", "3"),
+                        ("L", "4"), ("MN", "5"), ("R", "6")):
+    for _letter in _letters:
+        SOUNDEX_CODES[_letter] = _code
+
+
+def soundex(word):
+    """Return the four-character American Soundex key of a word"""
+    word = "".join(c for c in word.upper() if c.isalpha())
+    if not word:
+        return ""
+
+    key = word[0]
+    last = SOUNDEX_CODES.get(word[0], "")
+    for c in word[1:]:
+        code = SOUNDEX_CODES.get(c, "")
+        if code and code != last:
+            key += code
+            if len(key) == 4:
+                break
+        # H and W do not separate letters with the same code
+        if c not in "HW":
+            last = code
+    return key.ljust(4, "0")
+
+
+def inflections(word):
+    """Common spoken variants of a word (plural, past tense, -ing, -er, -y)"""
+    stem = word[:-1] if word.endswith("e") else word
+    return {word, word + "s", word + "es", stem + "ed", stem + "ing",
+            stem + "er", stem + "y"}
+
+
+class PhoneticIndex:
+    """
+    Maps phonetic keys of the configured words and their inflections back to
+    the configured word.
+
+    Args:
+        words: Single-word terms to index
+        strictness: "strict" uses Metaphone keys, "loose" the coarser Soundex
+        min_length: Shorter tokens are never matched phonetically
+        allow_words: Words never matched phonetically (COMMON_WORDS by default)
+    """
+
+    def __init__(self, words, strictness="strict", min_length=3, allow_words=COMMON_WORDS):
+        if strictness not in ("strict", "loose"):
+            raise ValueError(f"Unknown phonetic strictness '{strictness}'")
+        self.strictness = strictness
+        self.min_length = min_length
+        self.allow_words = frozenset(allow_words) - set(words)
+        self._encode = metaphone if strictness == "strict" else soundex
+        self._index = {}  # key -> [(variant, configured word)]
+        for word in words:
+            for variant in sorted(inflections(word)):
+                key = self._encode(variant)
+                if key:
+                    self._index.setdefault(key, []).append((variant, word))
+
+    def lookup(self, token):
+        """Return the configured word a token sounds like, or None"""
+        if len(token) < self.min_length or token in self.allow_words:
+            return None
+        for variant, word in self._index.get(self._encode(token), ()):
+            # Keys are coarse: also require a similar spelling
+            if token[0] == variant[0] and abs(len(token) - len(variant)) <= 1:
+                return word
+        return None
+
+
+class KeywordMatcher:
+    """
+    Precompiled matcher for a fixed vocabulary of words and phrases.
+
+    Args:
+        terms: Iterable of words or multi-word phrases
+        phonetic: "off", or the PhoneticIndex strictness ("strict"/"loose")
+            used for tokens that are not an exact hit
+        phonetic_min_length: Minimum token length for phonetic matching
+        phonetic_allow_words: Extra words never matched phonetically, on top
+            of COMMON_WORDS
+    """
+
+    def __init__(self, terms, phonetic="off", phonetic_min_length=3, phonetic_allow_words=()):
+        if phonetic not in PHONETIC_MODES:
+            raise ValueError(f"Unknown phonetic mode '{phonetic}', expected one of {PHONETIC_MODES}")
+        self.terms = []
+        self._words = set()
+
+        # Aho-Corasick automaton over tokens for multi-word phrases
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+        for term in terms:
+            term = normalize(term)
+            if not term or term in self.terms:
+                continue
+            self.terms.append(term)
+            tokens = term.split()
+            if len(tokens) == 1:
+                self._words.add(term)
+            else:
+                self._add_phrase(term, tokens)
+
+        self._has_phrases = len(self._goto) > 1
+        if self._has_phrases:
+            self._build_failure_links()
+
+        self.phonetic = None
+        if phonetic != "off":
+            allow_words = COMMON_WORDS | {normalize(word) for word in phonetic_allow_words}
+            self.phonetic = PhoneticIndex(sorted(self._words), phonetic, phonetic_min_length, allow_words)
+
+    def _add_phrase(self, term, tokens):
+        state = 0
+        for token in tokens:
+            next_state = self._goto[state].get(token)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][token] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append((term, len(tokens)))
+
+    def _build_failure_links(self):
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for token, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and token not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(token, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def match(self, text):
+        """
+        Find every configured term in a transcript
+
+        Returns:
+            List of Match tuples ordered by position
+        """
+        tokens = normalize(text).split()
+        matches = []
+        state = 0
+        for i, token in enumerate(tokens):
+            if token in self._words:
+                matches.append(Match(token, i, i + 1, "exact"))
+            elif self.phonetic is not None:
+                word = self.phonetic.lookup(token)
+                if word is not None:
+                    matches.append(Match(word, i, i + 1, "phonetic"))
+
+            if self._has_phrases:
+                while state and token not in self._goto[state]:
+                    state = self._fail[state]
+                state = self._goto[state].get(token, 0)
+                for term, length in self._output[state]:
+                    matches.append(Match(term, i - length + 1, i + 1, "exact"))
+
+        if self._has_phrases:
+            matches.sort(key=lambda m: (m.start, m.end))
+        return matches
+
+    def find_terms(self, text):
+        """Return the matched terms of a transcript in spoken order"""
+        return [m.term for m in self.match(text)]
@@ -28,10 +28,11 @@ def send_alert():
 
 
 def block_child_device():
-    """ Permanently block the child's device from the network """
-    from block_device import block_device
+    """ Permanently block the child's devices from the network """
+    from block_device import block_devices
     
-    success = block_device()
+    targets = [t.strip() for t in os.getenv("BLOCK_TARGETS", "").split(",") if t.strip()]
+    success = block_devices(targets)
     if success:
         print("Child's device permanently blocked!")
     else:
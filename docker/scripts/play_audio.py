@@ -2,11 +2,26 @@
 """
 Audio playback utility for the Raspberry Pi curse word detector.
 This script provides functionality to play spoken messages when curse words are detected.
+
+Synthesized messages are cached as WAV files named by a hash of
+(message, voice, speed, pitch): each message is rendered by espeak once and
+afterwards played directly with aplay. The cache is size-bounded and evicts
+the least recently played files first.
+
+Detectors play warnings through a single long-lived PlaybackService: a
+bounded queue that coalesces identical pending messages, plays escalation
+messages first and sets the volume once instead of on every message.
+
+Every playback is recorded in playback_tracker, so the capture pipeline can
+discard microphone audio that overlaps the system's own voice.
 """
 
+import hashlib
 import os
 import subprocess
+import threading
 import time
+from collections import deque
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -16,6 +31,50 @@ load_dotenv()
 AUDIO_ENABLED = os.getenv("AUDIO_ENABLED", "true").lower() == "true"
 AUDIO_VOLUME = int(os.getenv("AUDIO_VOLUME", "80"))  # 0-100
 DEFAULT_MESSAGE = os.getenv("AUDIO_MESSAGE", "You have said a bad word")
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "data/tts_cache")
+TTS_CACHE_MAX_BYTES = int(float(os.getenv("TTS_CACHE_MAX_MB", "20")) * 1024 * 1024)
+
+# Messages rendered ahead of time by warm_cache()
+CONFIGURED_MESSAGE_VARS = ["AUDIO_MESSAGE", "CURSE_WORD_WARNING",
+                           "FIRST_CURSE_WARNING", "THIRD_CURSE_WARNING"]
+
+_render_lock = threading.Lock()
+
+
+class PlaybackTracker:
+    """
+    Records when the speaker is active, on the time.monotonic() clock.
+
+    Args:
+        keep: Number of recent playback intervals remembered
+    """
+
+    def __init__(self, keep=16):
+        self._intervals = deque(maxlen=keep)  # [start, end or None while playing]
+        self._lock = threading.Lock()
+
+    def begin(self):
+        """Mark the start of a playback; returns a handle for end()"""
+        interval = [time.monotonic(), None]
+        with self._lock:
+            self._intervals.append(interval)
+        return interval
+
+    def end(self, interval):
+        """Mark the end of a playback"""
+        interval[1] = time.monotonic()
+
+    def overlaps(self, start, end, guard=0.0):
+        """True if [start, end] overlaps a playback widened by guard seconds"""
+        with self._lock:
+            for played_from, played_to in self._intervals:
+                if played_from - guard < end and (played_to is None or played_to + guard > start):
+                    return True
+        return False
+
+
+# Shared by the playback functions below and the detector's capture pipeline
+playback_tracker = PlaybackTracker()
 
 
 def set_volume(volume_percent):
@@ -34,6 +93,77 @@ def set_volume(volume_percent):
         return False
 
 
+def cache_path(message, voice="en+f3", speed=150, pitch=50):
+    """Return the cache file for a (message, voice, speed, pitch) combination"""
+    key = hashlib.sha256(f"{voice}|{speed}|{pitch}|{message}".encode("utf-8")).hexdigest()
+    return os.path.join(TTS_CACHE_DIR, f"{key[:32]}.wav")
+
+
+def render_message(message, voice="en+f3", speed=150, pitch=50):
+    """
+    Synthesize a message to the cache if it is not there yet
+
+    Returns:
+        Path of the cached WAV file, or None if caching is disabled or failed
+    """
+    if TTS_CACHE_MAX_BYTES <= 0:
+        return None
+
+    path = cache_path(message, voice, speed, pitch)
+    with _render_lock:
+        if os.path.exists(path):
+            # Mark as recently used for eviction
+            os.utime(path)
+            return path
+
+        try:
+            os.makedirs(TTS_CACHE_DIR, exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            subprocess.run(["espeak", f"-v{voice}", f"-p{pitch}", f"-s{speed}", "-w", tmp_path, message],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"Failed to render audio message: {e}")
+            return None
+
+        evict_cache(keep=path)
+    return path
+
+
+def evict_cache(keep=None):
+    """Delete least recently used WAV files until the cache fits TTS_CACHE_MAX_BYTES"""
+    try:
+        entries = []
+        for name in os.listdir(TTS_CACHE_DIR):
+            if name.endswith(".wav"):
+                path = os.path.join(TTS_CACHE_DIR, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+    except OSError:
+        return
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= TTS_CACHE_MAX_BYTES:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def warm_cache(messages=None, voice="en+f3", speed=150, pitch=50):
+    """Render the configured warning messages ahead of time"""
+    if messages is None:
+        messages = [os.getenv(name) for name in CONFIGURED_MESSAGE_VARS]
+        messages.append(DEFAULT_MESSAGE)
+    for message in dict.fromkeys(m for m in messages if m):
+        render_message(message, voice, speed, pitch)
+
+
 def play_message(message=None, voice="en+f3", speed=150, pitch=50):
     """
     Play a spoken message using espeak text-to-speech
@@ -55,12 +185,24 @@ def play_message(message=None, voice="en+f3", speed=150, pitch=50):
     if message is None:
         message = DEFAULT_MESSAGE
     
+    # Set volume first
+    set_volume(AUDIO_VOLUME)
+    return speak(message, voice, speed, pitch)
+
+
+def speak(message, voice="en+f3", speed=150, pitch=50):
+    """Play a message at the current volume; returns True on success"""
     try:
-        # Set volume first
-        set_volume(AUDIO_VOLUME)
-        
-        # Use espeak for text-to-speech
-        subprocess.run(["espeak", f"-v{voice}", f"-p{pitch}", f"-s{speed}", message])
+        # Play the cached rendering, falling back to live espeak text-to-speech
+        path = render_message(message, voice, speed, pitch)
+        interval = playback_tracker.begin()
+        try:
+            if path is not None:
+                subprocess.run(["aplay", "-q", path])
+            else:
+                subprocess.run(["espeak", f"-v{voice}", f"-p{pitch}", f"-s{speed}", message])
+        finally:
+            playback_tracker.end(interval)
         print(f"Played audio message: '{message}'")
         return True
     except Exception as e:
@@ -68,6 +210,106 @@ def play_message(message=None, voice="en+f3", speed=150, pitch=50):
         return False
 
 
+PRIORITY_NORMAL = 0
+PRIORITY_ESCALATION = 10
+
+
+class PlaybackService:
+    """
+    Plays messages one at a time from a bounded priority queue.
+
+    Identical pending messages are coalesced into one. When the queue is full,
+    a new message replaces the oldest pending message of lower priority, or is
+    dropped if there is none.
+
+    Args:
+        max_queue: Maximum number of pending messages
+        volume: Volume (0-100) set once when the service starts, None to leave it
+        player: Called as player(message, voice, speed, pitch) for each message
+    """
+
+    def __init__(self, max_queue=8, volume=AUDIO_VOLUME, player=speak):
+        self.max_queue = max_queue
+        self.volume = volume
+        self.player = player
+        self.current = None
+        self._pending = []  # [priority, seq, (message, voice, speed, pitch)]
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._thread = None
+
+        # Accounting
+        self.played = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    def start(self):
+        """Set the volume and start the playback worker"""
+        if not AUDIO_ENABLED:
+            print("Audio playback is disabled")
+            return
+        if self.volume is not None:
+            set_volume(self.volume)
+        self._thread = threading.Thread(target=self._run, name="playback", daemon=True)
+        self._thread.start()
+
+    def enqueue(self, message=None, priority=PRIORITY_NORMAL, voice="en+f3", speed=150, pitch=50):
+        """
+        Queue a message for playback
+
+        Returns:
+            True if the message is (or already was) pending, False if dropped
+        """
+        if not AUDIO_ENABLED:
+            return False
+        key = (message or DEFAULT_MESSAGE, voice, speed, pitch)
+
+        with self._cond:
+            for entry in self._pending:
+                if entry[2] == key:
+                    entry[0] = max(entry[0], priority)
+                    self.coalesced += 1
+                    return True
+
+            if len(self._pending) >= self.max_queue:
+                victim = min(self._pending, key=lambda e: (e[0], e[1]))
+                if victim[0] >= priority:
+                    self.dropped += 1
+                    return False
+                self._pending.remove(victim)
+                self.dropped += 1
+
+            self._seq += 1
+            self._pending.append([priority, self._seq, key])
+            self._cond.notify()
+            return True
+
+    def _next(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self._pending)
+            entry = max(self._pending, key=lambda e: (e[0], -e[1]))
+            self._pending.remove(entry)
+            self.current = entry[2][0]
+            return entry[2]
+
+    def _run(self):
+        while True:
+            message, voice, speed, pitch = self._next()
+            self.player(message, voice, speed, pitch)
+            self.played += 1
+            self.current = None
+
+    def stats(self):
+        """Return queue depth, the message being played and counters"""
+        return {
+            "queue_depth": len(self._pending),
+            "playing": self.current,
+            "played": self.played,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+        }
+
+
 if __name__ == "__main__":
     # When run directly, play the default message
     play_message()
\ No newline at end of file
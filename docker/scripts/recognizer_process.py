@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Runs speech recognition in a dedicated worker process.
+
+Audio capture, decoding, database writes and playback otherwise share one
+interpreter and its GIL. With RecognizerProcess the VAD, recognizer and
+keyword matcher run in a child process that loads the Vosk model itself and
+gets its own core. Each audio source has its own shared-memory ring buffer
+and recognizer, all on top of the one loaded model. Only small (source, seq,
+length, timestamp) descriptors go over the queue, and detections come back
+as compact events.
+
+The worker is forked, so it has to be started before the detector starts any
+other thread.
+"""
+
+import multiprocessing
+import os
+import queue
+import signal
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+
+from audio_capture import EchoSuppressor
+from detection_pipeline import build_pipeline, SAMPLE_RATE
+import sampling_profiler
+
+
+class SharedAudioRing:
+    """
+    Fixed-size ring of audio chunks in a shared memory block.
+
+    Every slot starts with the sequence number of the chunk it holds. The
+    reader checks it before and after copying a chunk out, so a chunk that
+    the writer overwrote because the reader fell behind is detected and
+    skipped instead of being decoded as garbage.
+
+    Args:
+        slots: Number of chunks the ring can hold
+        chunk_bytes: Maximum size of one chunk
+    """
+
+    HEADER = struct.Struct("q")
+
+    def __init__(self, slots, chunk_bytes):
+        self.slots = slots
+        self.chunk_bytes = chunk_bytes
+        self.shm = shared_memory.SharedMemory(
+            create=True, size=slots * (self.HEADER.size + chunk_bytes))
+        self._data_offset = slots * self.HEADER.size
+        self._next_seq = 0
+        for slot in range(slots):
+            self.HEADER.pack_into(self.shm.buf, slot * self.HEADER.size, -1)
+
+    def write(self, data):
+        """
+        Store a chunk, overwriting the oldest one
+
+        Returns:
+            (seq, length) descriptor for read()
+        """
+        seq = self._next_seq
+        self._next_seq += 1
+        slot = seq % self.slots
+        size = min(len(data), self.chunk_bytes)
+        start = self._data_offset + slot * self.chunk_bytes
+
+        # Invalidate the slot while it is being rewritten
+        self.HEADER.pack_into(self.shm.buf, slot * self.HEADER.size, -1)
+        self.shm.buf[start:start + size] = data[:size]
+        self.HEADER.pack_into(self.shm.buf, slot * self.HEADER.size, seq)
+        return seq, size
+
+    def read(self, seq, length):
+        """Return a copy of chunk seq, or None if it was already overwritten"""
+        slot = seq % self.slots
+        header = slot * self.HEADER.size
+        if self.HEADER.unpack_from(self.shm.buf, header)[0] != seq:
+            return None
+        start = self._data_offset + slot * self.chunk_bytes
+        data = bytes(self.shm.buf[start:start + length])
+        if self.HEADER.unpack_from(self.shm.buf, header)[0] != seq:
+            return None
+        return data
+
+    def close(self):
+        """Release and remove the shared memory block"""
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _worker(rings, descriptors, events, model_path, words, settings, stats_interval, parent_pid):
+    from vosk import Model
+
+    # Ctrl+C is handled by the parent, which stops the worker
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    sampling_profiler.install("recognizer")
+
+    # One model in memory; every source gets its own recognizer on top of it
+    model = Model(model_path)
+    pipelines = []
+    for index in range(len(rings)):
+        def on_detections(final_text, detections, index=index):
+            if detections or final_text:
+                events.put(("detections", index, final_text, detections,
+                            pipelines[index].last_utterance_hits))
+        pipelines.append(build_pipeline(model, words, on_detections, settings))
+    overruns = [0] * len(rings)
+    last_seq = [None] * len(rings)
+
+    events.put(("ready", os.getpid()))
+    last_stats = time.monotonic()
+
+    while True:
+        try:
+            item = descriptors.get(timeout=1.0)
+        except queue.Empty:
+            item = ()
+            if os.getppid() != parent_pid:
+                # The detector died without stopping us
+                return
+        if item is None:
+            return
+
+        if item:
+            index, seq, length, captured_at = item
+            last_seq[index] = seq
+            data = rings[index].read(seq, length)
+            if data is None:
+                overruns[index] += 1
+            else:
+                pipelines[index].feed(data, captured_at)
+
+        if time.monotonic() - last_stats >= stats_interval:
+            for index, pipeline in enumerate(pipelines):
+                stats = dict(pipeline.stats(), overruns=overruns[index], last_seq=last_seq[index])
+                if pipeline.vad:
+                    stats["vad"] = pipeline.vad.stats()
+                events.put(("stats", index, stats))
+            last_stats = time.monotonic()
+
+
+class RemoteSource:
+    """
+    Drop-in replacement for DetectionPipeline whose decoding happens in the
+    worker process.
+
+    Echo suppression stays in the detector process, next to the playback
+    tracker. Detections are delivered to on_detections on the event thread.
+    """
+
+    def __init__(self, process, index, name, ring, echo_guard=None):
+        self.process = process
+        self.index = index
+        self.name = name
+        self.ring = ring
+        self.echo_guard = echo_guard
+        self.vad = None  # runs in the worker; its stats are part of stats()
+        self.on_detections = None
+        self.last_utterance_hits = 0
+        self.worker_stats = {}
+
+        # Accounting
+        self.chunks_in = 0
+        self.chunks_sent = 0
+
+    def feed(self, data, captured_at):
+        """Hand one captured chunk to the worker"""
+        self.process.check_alive()
+        self.chunks_in += 1
+        if self.echo_guard and self.echo_guard.should_skip(captured_at):
+            return
+        seq, length = self.ring.write(data)
+        self.process.send(self.index, seq, length, captured_at)
+        self.chunks_sent += 1
+
+    def stats(self):
+        """Return transport counters and the worker's latest pipeline stats"""
+        last_seq = self.worker_stats.get("last_seq")
+        return {
+            "chunks_in": self.chunks_in,
+            "chunks_sent": self.chunks_sent,
+            "backlog": self.chunks_sent - 1 - last_seq if last_seq is not None else None,
+            "worker": self.worker_stats,
+        }
+
+
+class RecognizerProcess:
+    """
+    Decodes the audio of one or more sources in a single child process.
+
+    Args:
+        model_path: Vosk model directory, loaded once by the worker
+        words: Curse words to detect
+        settings: detection_pipeline.pipeline_settings() dict
+        sources: Source names; each gets a RemoteSource in self.sources
+        tracker: play_audio.PlaybackTracker; enables echo suppression when given
+        slots: Chunks each source's shared ring buffer can hold
+        stats_interval: Seconds between worker statistics updates
+    """
+
+    def __init__(self, model_path, words, settings, sources=("default",), tracker=None,
+                 slots=32, stats_interval=5):
+        self.sources = {}
+        for index, name in enumerate(sources):
+            echo_guard = EchoSuppressor(
+                tracker,
+                chunk_seconds=settings["chunk_frames"] / SAMPLE_RATE,
+                guard_seconds=settings["echo_guard_ms"] / 1000
+            ) if tracker is not None and settings["echo_suppression"] else None
+            ring = SharedAudioRing(slots, settings["chunk_frames"] * 2)
+            self.sources[name] = RemoteSource(self, index, name, ring, echo_guard)
+        self._by_index = list(self.sources.values())
+
+        context = multiprocessing.get_context("fork")
+        self._descriptors = context.Queue()
+        self._events = context.Queue()
+        self._process = context.Process(
+            target=_worker, name="recognizer",
+            args=([source.ring for source in self._by_index], self._descriptors, self._events,
+                  model_path, words, settings, stats_interval, os.getpid()),
+            daemon=True)
+        self._closing = False
+        self.ready = False  # set once the worker has loaded the model and installed its handlers
+
+    def start(self):
+        """Fork the worker and start receiving its events"""
+        self._process.start()
+        threading.Thread(target=self._receive, name="recognizer-events", daemon=True).start()
+
+    def check_alive(self):
+        """Raise RuntimeError if the worker has exited"""
+        if not self._process.is_alive():
+            raise RuntimeError(f"Recognizer process exited with code {self._process.exitcode}")
+
+    def send(self, index, seq, length, captured_at):
+        """Queue the descriptor of a chunk written to a source's ring"""
+        self._descriptors.put((index, seq, length, captured_at))
+
+    def _receive(self):
+        while not self._closing:
+            try:
+                event = self._events.get(timeout=1.0)
+            except queue.Empty:
+                continue
+
+            if event[0] == "detections":
+                _, index, final_text, detections, hits = event
+                source = self._by_index[index]
+                source.last_utterance_hits = hits
+                if source.on_detections is not None:
+                    source.on_detections(final_text, detections)
+            elif event[0] == "stats":
+                self._by_index[event[1]].worker_stats = event[2]
+            elif event[0] == "ready":
+                self.ready = True
+                print(f"Recognizer process {event[1]} ready")
+
+    def close(self):
+        """Stop the worker and remove the shared memory"""
+        self._closing = True
+        if self._process.is_alive():
+            self._descriptors.put(None)
+            self._process.join(timeout=2)
+            if self._process.is_alive():
+                self._process.terminate()
+        for source in self._by_index:
+            source.ring.close()
+
+    def stats(self):
+        """Return the worker process state"""
+        return {"worker_pid": self._process.pid, "worker_alive": self._process.is_alive(),
+                "worker_ready": self.ready}
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+On-demand sampling profiler for the Raspberry Pi curse word detector.
+
+Nothing runs until a profile is requested: install() only registers a
+SIGUSR1 handler. On the signal, a background thread samples the stacks of
+every thread with sys._current_frames() for a few seconds and writes them in
+the collapsed-stack format read by flamegraph.pl and speedscope, one
+"process;thread;outer;...;inner count" line per distinct stack.
+
+health_check.py requests a profile by writing a request file with an id and
+a duration, then signalling the detector (and its recognizer worker).
+A profile can also be taken by hand with `kill -USR1 <pid>`.
+"""
+
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "false").lower() == "true"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "data/profiles")
+REQUEST_FILE = "request.json"
+
+# A request file older than this is ignored and the defaults are used instead
+REQUEST_MAX_AGE = 10
+
+
+def frame_label(frame):
+    """Return "function (file:line)" for a stack frame"""
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse(frame):
+    """Return the stack ending at frame as "outer;...;inner" """
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+def sample_stacks(seconds, interval=0.01, process_name="python"):
+    """
+    Sample the stacks of all other threads
+
+    Args:
+        seconds: How long to sample
+        interval: Seconds between samples
+        process_name: Root frame name, so profiles of several processes can be merged
+
+    Returns:
+        Counter of collapsed stacks
+    """
+    samples = Counter()
+    me = threading.get_ident()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident != me:
+                samples[f"{process_name};{names.get(ident, ident)};{collapse(frame)}"] += 1
+        time.sleep(interval)
+    return samples
+
+
+def write_collapsed(samples, path):
+    """Write samples in the collapsed-stack format, most frequent first"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        for stack, count in samples.most_common():
+            f.write(f"{stack} {count}\n")
+    os.replace(tmp_path, path)
+
+
+def output_path(request_id, pid, directory=PROFILE_DIR):
+    """Return the profile file written by process pid for a request"""
+    return os.path.join(directory, f"{request_id}-{pid}.folded")
+
+
+def _read_request(directory, default_seconds, interval):
+    try:
+        with open(os.path.join(directory, REQUEST_FILE)) as f:
+            request = json.load(f)
+        if time.time() - request["created"] <= REQUEST_MAX_AGE:
+            return request
+    except (OSError, ValueError, KeyError):
+        pass
+    return {"id": time.strftime("%Y%m%d-%H%M%S"), "seconds": default_seconds, "interval": interval}
+
+
+def install(process_name, default_seconds=10, interval=0.01, directory=PROFILE_DIR):
+    """
+    Profile this process whenever it receives SIGUSR1
+
+    Must be called from the main thread. Does nothing if PROFILER_ENABLED is off.
+
+    Args:
+        process_name: Root frame name in the output, e.g. "detector"
+        default_seconds: Duration when there is no fresh request file
+        interval: Default seconds between samples
+        directory: Where request and profile files live
+    """
+    if not PROFILER_ENABLED:
+        return
+    running = threading.Event()
+
+    def run(request):
+        try:
+            samples = sample_stacks(request["seconds"], request.get("interval", interval),
+                                    process_name)
+            os.makedirs(directory, exist_ok=True)
+            path = output_path(request["id"], os.getpid(), directory)
+            write_collapsed(samples, path)
+            print(f"Wrote profile to {path}")
+        except Exception as e:
+            print(f"Profiling failed: {e}")
+        finally:
+            running.clear()
+
+    def handler(signum, frame):
+        if running.is_set():
+            return
+        running.set()
+        request = _read_request(directory, default_seconds, interval)
+        threading.Thread(target=run, args=(request,), name="profiler", daemon=True).start()
+
+    signal.signal(signal.SIGUSR1, handler)
+
+
+def request_profile(pids, seconds=10, interval=0.01, directory=PROFILE_DIR):
+    """
+    Profile other processes and collect their output
+
+    Args:
+        pids: Processes that called install()
+        seconds: Sampling duration
+        interval: Seconds between samples
+
+    Returns:
+        Collapsed-stack text of every process that answered in time
+    """
+    os.makedirs(directory, exist_ok=True)
+    request_id = f"{int(time.time() * 1000)}"
+    tmp_path = os.path.join(directory, f"{REQUEST_FILE}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump({"id": request_id, "seconds": seconds, "interval": interval,
+                   "created": time.time()}, f)
+    os.replace(tmp_path, os.path.join(directory, REQUEST_FILE))
+
+    for pid in pids:
+        os.kill(pid, signal.SIGUSR1)
+
+    # Wait for every process to finish sampling and write its file
+    pending = {pid: output_path(request_id, pid, directory) for pid in pids}
+    deadline = time.monotonic() + seconds + 10
+    while any(not os.path.exists(path) for path in pending.values()) and time.monotonic() < deadline:
+        time.sleep(0.2)
+
+    output = []
+    for path in pending.values():
+        try:
+            with open(path) as f:
+                output.append(f.read())
+            os.remove(path)
+        except OSError:
+            pass
+    return "".join(output)
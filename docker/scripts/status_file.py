@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Shares detector status with the health check service.
+
+The detector and health_check.py run as separate processes. The detector
+periodically writes a JSON snapshot built from registered providers to a
+status file, which health_check.py reads when its endpoints are queried.
+"""
+
+import json
+import os
+import threading
+import time
+
+DEFAULT_STATUS_FILE = "data/detector_status.json"
+
+
+class StatusReporter:
+    """
+    Periodically writes {name: provider()} snapshots to a JSON file.
+
+    Args:
+        path: Status file path
+        interval: Seconds between writes
+    """
+
+    def __init__(self, path=DEFAULT_STATUS_FILE, interval=5):
+        self.path = path
+        self.interval = interval
+        self._providers = {}
+        self._thread = None
+
+    def register(self, name, provider):
+        """Add a callable returning a JSON-serializable section"""
+        self._providers[name] = provider
+
+    def start(self):
+        """Start writing snapshots in the background"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="status-reporter", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.write()
+            except Exception as e:
+                print(f"Failed to write status file: {e}")
+            time.sleep(self.interval)
+
+    def write(self):
+        """Write one snapshot atomically"""
+        status = {"updated": time.time(), "pid": os.getpid()}
+        for name, provider in list(self._providers.items()):
+            try:
+                status[name] = provider()
+            except Exception as e:
+                status[name] = {"error": str(e)}
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(status, f)
+        os.replace(tmp_path, self.path)
+
+
+def read_status(path=DEFAULT_STATUS_FILE):
+    """Return the last snapshot written by the detector, or None"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
@@ -3,21 +3,25 @@
 UniFi CloudKey+ Integration: Device Unblocking Tool
 
 This script unblocks network access for a device by its MAC address using the UniFi CloudKey+ API.
-It authenticates with the UniFi Controller, obtains a session cookie and CSRF token,
-then sends an unblock-sta command to the station manager API.
+The work is done by unifi_client.UniFiClient, which logs in once and reuses the session
+cookie and CSRF token; importing this module exposes unblock_device() for in-process use.
 
 Usage:
-    python unblock_device.py [mac_address]
+    python unblock_device.py [mac_address_or_group ...]
     
-    If mac_address is not provided, it will be read from the CHILD_DEVICE_MAC environment variable.
+    Arguments may be MAC addresses or device group names (DEVICE_GROUP_<NAME> in config.env).
+    If none are provided, every configured device (CHILD_DEVICE_MACS or CHILD_DEVICE_MAC, plus
+    all device groups) is unblocked. Several devices are unblocked concurrently over one session.
 """
 
-import requests
 import os
 import sys
 from pathlib import Path
 import dotenv
 
+from unifi_client import UniFiError, get_client, resolve_targets
+
+
 # Try to find and load the config.env file
 def load_environment():
     # Check for config.env in the current directory
@@ -40,71 +44,67 @@ def load_environment():
     
     return False
 
-# Make a best effort to load environment variables
-if not load_environment():
-    print("Warning: Could not find config.env file. Using default values.")
-
-# Configuration from environment variables
-controller_host = os.getenv("UNIFI_CONTROLLER", "unifi.example.com")
-username = os.getenv("UNIFI_USERNAME", "admin")
-password = os.getenv("UNIFI_PASSWORD", "yourpassword")
-site = os.getenv("UNIFI_SITE", "default")
-device_mac = os.getenv("CHILD_DEVICE_MAC", "AA:BB:CC:DD:EE:FF")
-ssl_verify = os.getenv("UNIFI_SSL_VERIFY", "true").lower() == "true"
-
-# Accept an optional MAC address as command-line argument
-if len(sys.argv) > 1:
-    device_mac = sys.argv[1]
-
-session = requests.Session()
-session.headers.update(
-    {"Content-Type": "application/json", "Accept": "application/json"})
-# Verify SSL certificates (can be disabled via environment variable, but not recommended)
-session.verify = ssl_verify
-
-# 1. Log in to UniFi controller
-login_url = f"https://{controller_host}/api/auth/login"
-credentials = {"username": username, "password": password}
-try:
-    resp = session.post(login_url, json=credentials, timeout=10)
-    resp.raise_for_status()
-except requests.exceptions.RequestException as err:
-    print(f"Failed to connect or authenticate: {err}")
-    exit(1)
-
-if resp.status_code != 200 or resp.json().get("meta", {}).get("rc") == "error":
-    msg = resp.json().get("meta", {}).get("msg", "") if resp.headers.get(
-        "Content-Type", "").startswith("application/json") else resp.text
-    print(f"Login failed. Server response: {msg or resp.status_code}")
-    exit(1)
-
-csrf_token = resp.headers.get("X-CSRF-Token")
-if csrf_token:
-    session.headers.update({"X-CSRF-Token": csrf_token})
-
-# 2. Unblock the device
-unblock_url = f"https://{controller_host}/proxy/network/api/s/{site}/cmd/stamgr"
-payload = {"cmd": "unblock-sta", "mac": device_mac.lower()}
-try:
-    resp = session.post(unblock_url, json=payload, timeout=10)
-    resp.raise_for_status()
-except requests.exceptions.Timeout:
-    print("Error: Request to unblock device timed out")
-    exit(1)
-except requests.exceptions.HTTPError as http_err:
-    print(f"Error: Unblock request HTTP {
-          http_err.response.status_code} - {http_err.response.text}")
-    exit(1)
-except requests.exceptions.RequestException as err:
-    print(f"Error: Failed to send unblock request - {err}")
-    exit(1)
-
-result = resp.json()
-if result.get("meta", {}).get("rc") == "ok":
+
+def unblock_device(device_mac=None, client=None):
+    """
+    Unblock a device on the UniFi controller
+
+    Args:
+        device_mac: MAC address (defaults to CHILD_DEVICE_MAC)
+        client: UniFiClient to use (defaults to the shared process-wide client)
+
+    Returns:
+        Boolean indicating success
+    """
+    if device_mac is None:
+        device_mac = os.getenv("CHILD_DEVICE_MAC", "AA:BB:CC:DD:EE:FF")
+    if client is None:
+        client = get_client()
+
+    try:
+        client.unblock(device_mac)
+    except UniFiError as err:
+        print(f"Failed to unblock device {device_mac}. {err}")
+        return False
+
     print(f"Device {device_mac} has been *unblocked* successfully.")
-else:
-    error_message = result.get("meta", {}).get("msg", "Unknown error")
-    print(f"Failed to unblock device {
-          device_mac}. Controller error: {error_message}")
+    return True
+
+
+def unblock_devices(targets=None, client=None, deadline=None):
+    """
+    Unblock several devices concurrently
+
+    Args:
+        targets: MAC addresses and/or device group names (defaults to every configured device)
+        client: UniFiClient to use (defaults to the shared process-wide client)
+        deadline: Seconds to wait for all devices (defaults to BLOCK_DEADLINE)
+
+    Returns:
+        Boolean indicating whether every device was unblocked
+    """
+    if client is None:
+        client = get_client()
+    if deadline is None:
+        deadline = float(os.getenv("BLOCK_DEADLINE", "30"))
+
+    results = client.unblock_many(resolve_targets(targets), deadline=deadline)
+    for mac, error in results.items():
+        if error is None:
+            print(f"Device {mac} has been *unblocked* successfully.")
+        else:
+            print(f"Failed to unblock device {mac}. {error}")
+    return bool(results) and all(error is None for error in results.values())
+
+
+if __name__ == "__main__":
+    # Make a best effort to load environment variables
+    if not load_environment():
+        print("Warning: Could not find config.env file. Using default values.")
+
+    # Accept optional MAC addresses or group names as command-line arguments
+    success = unblock_devices(sys.argv[1:])
 
-session.post(f"https://{controller_host}/proxy/network/api/logout", timeout=5)
+    # (Optional) Logout to clean up session on controller
+    get_client().logout()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,125 @@
+"""WordCountStore flushes, run through mysql-connector's own parameter handling."""
+
+import time
+from contextlib import contextmanager
+
+import pytest
+
+connector = pytest.importorskip("mysql.connector.connection")
+from mysql.connector.conversion import MySQLConverter
+from mysql.connector.cursor import MySQLCursor
+
+from count_store import WordCountStore, DetectionEvent
+
+
+class RecordingConnection(connector.MySQLConnection):
+    """An unconnected MySQLConnection that records the statements its cursors send"""
+
+    def __init__(self):
+        super().__init__()
+        self.statements = []
+        self.commits = 0
+        self._sql_mode = ""
+        self.converter = MySQLConverter(self.python_charset, True)
+
+    def handle_unread_result(self, prepared=False):
+        pass
+
+    def cmd_query(self, query, *args, **kwargs):
+        self.statements.append(query.decode())
+        return {"affected_rows": 1, "insert_id": 0, "warning_count": 0, "server_status": 0}
+
+    def cursor(self, *args, **kwargs):
+        return MySQLCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+
+class Pool:
+    def __init__(self):
+        self.db = RecordingConnection()
+
+    @contextmanager
+    def connection(self):
+        yield self.db
+
+
+def flushed_store(*events):
+    store = WordCountStore(Pool(), source="kitchen")
+    store._pending = list(events)
+    store._flush()
+    return store
+
+
+def test_flush_upserts_word_counts():
+    now = time.time()
+    store = flushed_store(DetectionEvent(now, "curse1", 0.9, "kitchen"),
+                          DetectionEvent(now, "curse1", None, "kitchen"),
+                          DetectionEvent(now, "curse2", 0.5, "den"))
+
+    upsert = store.pool.db.statements[0]
+    assert upsert.startswith("INSERT INTO word_counts")
+    assert "('curse1', 2),('curse2', 1)" in upsert
+    assert upsert.endswith("ON DUPLICATE KEY UPDATE count = count + VALUES(count)")
+
+
+def test_flush_writes_events_and_rollups():
+    detected_at = time.mktime((2026, 5, 4, 13, 25, 0, 0, 0, -1))
+    store = flushed_store(DetectionEvent(detected_at, "curse1", 0.9, "kitchen"),
+                          DetectionEvent(detected_at + 60, "curse1", None, "kitchen"))
+
+    assert store.flush_errors == 0
+    assert store.events_written == 2
+    assert store._pending == []
+    assert store.pool.db.commits == 1
+    _, events, hourly, daily = store.pool.db.statements
+    assert "('2026-05-04 13:25:00', 'curse1', 0.9, 'kitchen'),('2026-05-04 13:26:00', 'curse1', NULL, 'kitchen')" in events
+    assert "VALUES ('2026-05-04 13:00:00', 'curse1', 'kitchen', 2) ON DUPLICATE KEY UPDATE count = count + VALUES(count)" in hourly
+    assert "VALUES ('2026-05-04', 'curse1', 'kitchen', 2) ON DUPLICATE KEY UPDATE count = count + VALUES(count)" in daily
+
+
+def test_pending_detections_are_bounded():
+    store = WordCountStore(Pool(), flush_size=1000, flush_interval=60, max_pending=3)
+    store.start()
+    for word in ("a", "b", "c", "d", "e"):
+        store.record(word)
+    deadline = time.monotonic() + 2
+    while store._queue.qsize() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.05)
+
+    assert [event.word for event in store._pending] == ["c", "d", "e"]
+    assert store.stats()["events_dropped"] == 2
+    assert store.get("a") == 1
+
+
+def wait_for_writer(store):
+    deadline = time.monotonic() + 2
+    while store._queue.qsize() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.05)
+
+
+def test_partial_detection_is_written_with_its_confirmed_confidence():
+    store = WordCountStore(Pool(), flush_size=1, flush_interval=60, source="kitchen")
+    store.start()
+    assert store.record("curse1", provisional=True) == 1
+    wait_for_writer(store)
+    assert store.stats()["provisional"] == 1
+    assert store.pool.db.statements == []
+
+    store.confirm("curse1", 0.75)
+    wait_for_writer(store)
+    assert store.stats()["provisional"] == 0
+    assert ", 'curse1', 0.75, 'kitchen')" in store.pool.db.statements[1]
+
+
+def test_unconfirmed_partial_detection_is_written_without_confidence():
+    store = WordCountStore(Pool(), flush_size=1, flush_interval=60, source="kitchen",
+                           confirm_timeout=0.1)
+    store.start()
+    store.record("curse1", provisional=True)
+    time.sleep(0.3)
+    assert store.events_written == 1
+    assert ", 'curse1', NULL, 'kitchen')" in store.pool.db.statements[1]
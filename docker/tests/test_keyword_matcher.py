@@ -0,0 +1,30 @@
+"""Exact and phonetic matching of KeywordMatcher."""
+
+from keyword_matcher import KeywordMatcher, metaphone
+
+
+def test_exact_words_and_phrases():
+    matcher = KeywordMatcher(["darn", "oh my gosh"])
+    assert matcher.find_terms("well darn it oh my gosh") == ["darn", "oh my gosh"]
+    assert matcher.find_terms("darned darnit") == []
+
+
+def test_hello_is_not_hell():
+    assert metaphone("hello") == metaphone("hell")
+    matcher = KeywordMatcher(["hell"], phonetic="strict")
+    assert matcher.find_terms("hello there") == []
+    assert matcher.find_terms("hells bells") == ["hell"]
+
+
+def test_phonetic_hit_needs_similar_spelling():
+    matcher = KeywordMatcher(["crap"], phonetic="strict")
+    assert [m.path for m in matcher.match("krap")] == []
+    assert [m.path for m in matcher.match("crapp")] == ["phonetic"]
+    assert matcher.find_terms("crappiest") == []
+
+
+def test_configured_allow_words():
+    matcher = KeywordMatcher(["darn"], phonetic="loose")
+    assert matcher.find_terms("dern") == ["darn"]
+    matcher = KeywordMatcher(["darn"], phonetic="loose", phonetic_allow_words=["Dern"])
+    assert matcher.find_terms("dern") == []
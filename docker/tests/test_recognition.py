@@ -0,0 +1,41 @@
+"""Detections and confirmations from KeywordStream."""
+
+import json
+
+import pytest
+
+pytest.importorskip("vosk")
+from keyword_matcher import KeywordMatcher
+from recognition import KeywordStream
+
+
+class ScriptedRecognizer:
+    """Replays partial hypotheses, then one final result"""
+
+    def __init__(self, partials, final):
+        self.partials = list(partials)
+        self.final = final
+
+    def AcceptWaveform(self, data):
+        return not self.partials
+
+    def PartialResult(self):
+        return json.dumps({"partial": self.partials.pop(0)})
+
+    def Result(self):
+        return json.dumps(self.final)
+
+
+def test_partial_hit_is_confirmed_with_the_final_confidence():
+    final = {"text": "oh curse1", "result": [{"word": "oh", "conf": 0.9}, {"word": "curse1", "conf": 0.6}]}
+    stream = KeywordStream(ScriptedRecognizer(["oh curse1", "oh curse1"], final),
+                           KeywordMatcher(["curse1"]).match, use_partials=True, partial_stability=2)
+
+    assert stream.accept(b"")[1] == []
+    fired = stream.accept(b"")[1]
+    assert [(d.word, d.partial, d.confidence, d.confirms) for d in fired] == [("curse1", True, None, False)]
+
+    text, detections = stream.accept(b"")
+    assert text == "oh curse1"
+    assert [(d.word, d.confidence, d.confirms) for d in detections] == [("curse1", 0.6, True)]
+    assert stream.last_utterance_hits == 1
@@ -1,93 +1,208 @@
-from play_audio import play_message
 import sys
+import atexit
 import pyaudio
-import mariadb
-import json
 import os
 import threading
-from vosk import Model, KaldiRecognizer
+import time
+from collections import Counter
+from functools import partial
+from vosk import Model
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-# Load Vosk Model
-model_path = os.getenv("VOSK_MODEL_PATH", "vosk-model")
-model = Model(model_path)
-recognizer = KaldiRecognizer(model, 16000)
-
-# Connect to local MariaDB database
-db = mariadb.connect(
-    host=os.getenv("MARIADB_HOST", "localhost"),
-    user=os.getenv("MARIADB_USER", "pi_user"),
-    password=os.getenv("MARIADB_PASSWORD", "yourpassword"),
-    database=os.getenv("MARIADB_DATABASE", "curse_word_db")
+# Import the scripts from the scripts directory
+sys.path.append(os.path.join(os.path.dirname(__file__), 'scripts'))
+from db_pool import ConnectionPool, make_connect
+from play_audio import PlaybackService, PRIORITY_ESCALATION, playback_tracker, warm_cache
+from audio_capture import AudioCapture, parse_audio_inputs, find_input_device
+from detection_pipeline import build_pipeline, pipeline_settings, SAMPLE_RATE
+from recognizer_process import RecognizerProcess
+from count_store import WordCountStore, DEFAULT_SOURCE
+import sampling_profiler
+
+# Pooled connections to the local MariaDB database; they reconnect with backoff
+# when the server restarts or an idle connection times out
+db_pool = ConnectionPool(
+    make_connect(
+        "mariadb",
+        host=os.getenv("MARIADB_HOST", "localhost"),
+        user=os.getenv("MARIADB_USER", "pi_user"),
+        password=os.getenv("MARIADB_PASSWORD", "yourpassword"),
+        database=os.getenv("MARIADB_DATABASE", "curse_word_db"),
+        timeout=int(os.getenv("DB_QUERY_TIMEOUT", "10"))
+    ),
+    size=int(os.getenv("DB_POOL_SIZE", "2")),
+    retries=int(os.getenv("DB_RECONNECT_ATTEMPTS", "5"))
 )
-cursor = db.cursor()
 
 # List of curse words
 curse_words_str = os.getenv("CURSE_WORDS", "curse1,curse2,curse3")
 curse_words = [word.strip() for word in curse_words_str.split(",")]
 
-# Import the scripts from the scripts directory
-sys.path.append(os.path.join(os.path.dirname(__file__), 'scripts'))
+# Audio sources: one microphone per room ("name=device" entries in AUDIO_INPUTS),
+# or the default input; detections are attributed to the source that heard them
+source_device = os.getenv("SOURCE_DEVICE") or DEFAULT_SOURCE
+audio_inputs = [(f"{source_device}/{name}", device)
+                for name, device in parse_audio_inputs(os.getenv("AUDIO_INPUTS", ""))]
+if not audio_inputs:
+    audio_inputs = [(source_device, None)]
+
+# Echo guard, VAD, speech recognizer and keyword matcher settings
+settings = pipeline_settings()
+model_path = os.getenv("VOSK_MODEL_PATH", "vosk-model")
+recognizer_process = None
+if os.getenv("RECOGNIZER_PROCESS", "false").lower() == "true":
+    # Decode in a worker process fed through shared memory, so recognition
+    # gets its own core; it is forked before any other thread starts
+    recognizer_process = RecognizerProcess(
+        model_path, curse_words, settings, [name for name, _ in audio_inputs],
+        tracker=playback_tracker, slots=int(os.getenv("RECOGNIZER_PROCESS_SLOTS", "32")))
+    recognizer_process.start()
+    atexit.register(recognizer_process.close)
+else:
+    # Load the Vosk model once; every source gets its own recognizer on top of it
+    model = Model(model_path)
+
+# Counts are cached in memory; counts, detection events and hourly/daily
+# rollups are written to the database in batches in the background
+counts = WordCountStore(
+    db_pool,
+    flush_size=int(os.getenv("DB_FLUSH_SIZE", "20")),
+    flush_interval=float(os.getenv("DB_FLUSH_INTERVAL", "5")),
+    source=source_device,
+    max_pending=int(os.getenv("DB_MAX_PENDING", "10000"))
+)
+try:
+    counts.warm()
+except Exception as e:
+    print(f"Could not load word counts, starting from zero: {e}")
+counts.start()
+atexit.register(counts.close)
+
+# Render the configured warnings to the TTS cache ahead of the first detection
+threading.Thread(target=warm_cache, name="tts-warm", daemon=True).start()
+
+# Warnings are spoken one at a time by a single playback worker
+playback = PlaybackService(
+    max_queue=int(os.getenv("PLAYBACK_QUEUE_SIZE", "8")))
+playback.start()
 
 # Audio playback function for curse word warnings
 
 
 def play_curse_warning(count, word):
-    try:
-        # Get custom message based on count
-        if count % 3 == 1:  # First occurrence using modulo
-            custom_message = os.getenv(
-                "FIRST_CURSE_WARNING", f"You said a bad word: {word}")
-            play_message(custom_message)
-        elif count % 3 == 0:  # Third occurrence using modulo
-            custom_message = os.getenv(
-                "THIRD_CURSE_WARNING", f"Warning! You have said bad words 3 times!")
-            play_message(custom_message)
-    except Exception as e:
-        print(f"Failed to play warning audio: {e}")
-
-
-# Audio input setup
+    # Get custom message based on count
+    if count % 3 == 1:  # First occurrence using modulo
+        custom_message = os.getenv(
+            "FIRST_CURSE_WARNING", f"You said a bad word: {word}")
+        playback.enqueue(custom_message)
+    elif count % 3 == 0:  # Third occurrence using modulo
+        custom_message = os.getenv(
+            "THIRD_CURSE_WARNING", f"Warning! You have said bad words 3 times!")
+        # Escalations jump ahead of ordinary warnings
+        playback.enqueue(custom_message, priority=PRIORITY_ESCALATION)
+
+
+# Update the tally and play a warning for each curse word detected by a source
+def handle_detections(source, final_text, detections):
+    for detection in detections:
+        word = detection.word
+        if detection.confirms:
+            # Already acted on from a partial result; only its confidence is new
+            counts.confirm(word, detection.confidence, source=source)
+            continue
+        source_detections[source] += 1
+        print(f"Detected curse word in {source}: {word} ({detection.path} match)")
+
+        # Count this occurrence; the database write happens in the background
+        current_count = counts.record(word, confidence=detection.confidence, source=source,
+                                      provisional=detection.partial)
+        print(f"Updated count for '{word}' to {current_count}")
+
+        # Play appropriate warning based on count
+        play_curse_warning(current_count, word)
+
+
+source_detections = Counter()
+pipelines = {}
+for name, _ in audio_inputs:
+    if recognizer_process is not None:
+        pipelines[name] = recognizer_process.sources[name]
+        pipelines[name].on_detections = partial(handle_detections, name)
+    else:
+        pipelines[name] = build_pipeline(model, curse_words, partial(handle_detections, name),
+                                         settings, tracker=playback_tracker)
+print(f"Speech recognizer mode: {settings['recognizer_mode']}")
+
+# Audio capture configuration
+chunk_frames = settings["chunk_frames"]
+buffer_chunks = int(os.getenv("AUDIO_BUFFER_CHUNKS", "64"))
+stats_interval = int(os.getenv("AUDIO_STATS_INTERVAL", "60"))
+
+# Audio input setup: every microphone's callback fills its own ring buffer so
+# slow recognition never drops frames
 p = pyaudio.PyAudio()
-stream = p.open(format=pyaudio.paInt16, channels=1,
-                rate=16000, input=True, frames_per_buffer=8000)
-stream.start_stream()
-
-print("Curse word detector started. Listening for words...")
+captures = {}
+for name, device in audio_inputs:
+    captures[name] = AudioCapture(chunk_frames=chunk_frames,
+                                  buffer_chunks=buffer_chunks,
+                                  name=f"audio-capture-{name}")
+    stream = p.open(format=pyaudio.paInt16, channels=1,
+                    rate=SAMPLE_RATE, input=True,
+                    input_device_index=find_input_device(p, device),
+                    frames_per_buffer=chunk_frames,
+                    stream_callback=captures[name].callback,
+                    start=False)
+    captures[name].start(stream)
+
+
+# Per-source capture, echo suppression, VAD and recognizer counters
+def source_stats(name):
+    pipeline = pipelines[name]
+    stats = {
+        "audio_capture": captures[name].stats(),
+        "pipeline": pipeline.stats(),
+        "detections": source_detections[name],
+    }
+    if pipeline.vad:
+        stats["vad"] = pipeline.vad.stats()
+    if pipeline.echo_guard:
+        stats["echo_suppression"] = pipeline.echo_guard.stats()
+    return stats
+
+
+# Feed one source's captured audio through its recognizer
+def recognize(name):
+    capture, pipeline = captures[name], pipelines[name]
+    while True:
+        chunk = capture.read(timeout=1.0)
+        if chunk is not None:
+            pipeline.feed(*chunk)
+
+
+# Sample thread stacks on SIGUSR1 (e.g. from the health check's /profile)
+sampling_profiler.install("detector")
+
+recognizers = [threading.Thread(target=recognize, args=(name,),
+                                name=f"recognize-{name}", daemon=True)
+               for name in pipelines]
+for thread in recognizers:
+    thread.start()
+
+print(f"Curse word detector started. Listening on {len(audio_inputs)} input(s)...")
+last_stats = time.time()
 
 while True:
-    data = stream.read(4000, exception_on_overflow=False)
-    if recognizer.AcceptWaveform(data):
-        result = json.loads(recognizer.Result())
-        text = result.get("text", "").lower()
-
-        # Check each word in the transcript
-        words = text.split()
-        for word in words:
-            if word in curse_words:
-                print(f"Detected curse word: {word}")
-
-                # Get current count for this specific word
-                cursor.execute(
-                    "SELECT count FROM word_counts WHERE word = %s", (word,))
-                result = cursor.fetchone()
-
-                if result:
-                    current_count = result[0] + 1  # Add 1 for this occurrence
-
-                    # Update the count in the database
-                    cursor.execute("UPDATE word_counts SET count = %s WHERE word = %s",
-                                   (current_count, word))
-                    db.commit()
-
-                    print(f"Updated count for '{word}' to {current_count}")
-
-                    # Play appropriate warning based on count
-                    warning_thread = threading.Thread(
-                        target=play_curse_warning,
-                        args=(current_count, word)
-                    )
-                    warning_thread.start()
+    time.sleep(1.0)
+    if not all(thread.is_alive() for thread in recognizers):
+        # e.g. the recognizer process died
+        print("A recognition thread stopped, exiting")
+        sys.exit(1)
+
+    if stats_interval and time.time() - last_stats >= stats_interval:
+        for name in pipelines:
+            print(f"Source {name} stats: {source_stats(name)}")
+        print(f"Playback stats: {playback.stats()}")
+        last_stats = time.time()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Write-behind store for curse word detections.
+
+Detections update an in-memory cache of word counts (warmed from word_counts
+at startup) and return immediately, so escalation logic never waits on the
+database. A background writer receives the detection events through a
+queue and flushes them in one transaction once enough have accumulated or
+the flush interval has passed. Each flush:
+
+- adds the coalesced per-word increments to word_counts,
+- appends the events to detection_events,
+- adds them to the hourly and daily rollup tables, so dashboards read
+  pre-aggregated rows instead of scanning events.
+
+Detections fired from a partial recognizer result are counted at once but
+held back from the database until the final result confirms them with a
+confidence, or until confirm_timeout passes.
+
+The upserts take the increment from VALUES(count) rather than a trailing
+placeholder: mysql-connector rewrites executemany INSERTs into one multi-row
+statement and drops the ON DUPLICATE KEY UPDATE clause while substituting
+rows, so parameters there are never filled in.
+"""
+
+import queue
+import socket
+import threading
+import time
+from collections import Counter, deque, namedtuple
+from datetime import datetime
+
+from metrics import Histogram
+
+UPSERT_COUNT_SQL = (
+    "INSERT INTO word_counts (word, count) VALUES (%s, %s) "
+    "ON DUPLICATE KEY UPDATE count = count + VALUES(count)"
+)
+INSERT_EVENT_SQL = (
+    "INSERT INTO detection_events (detected_at, word, confidence, source_device) "
+    "VALUES (%s, %s, %s, %s)"
+)
+UPSERT_HOURLY_SQL = (
+    "INSERT INTO detection_rollup_hourly (bucket_start, word, source_device, count) "
+    "VALUES (%s, %s, %s, %s) ON DUPLICATE KEY UPDATE count = count + VALUES(count)"
+)
+UPSERT_DAILY_SQL = (
+    "INSERT INTO detection_rollup_daily (bucket_date, word, source_device, count) "
+    "VALUES (%s, %s, %s, %s) ON DUPLICATE KEY UPDATE count = count + VALUES(count)"
+)
+
+# One detection as written to detection_events; provisional events wait for a Confirmation
+DetectionEvent = namedtuple("DetectionEvent", ["detected_at", "word", "confidence", "source", "provisional"],
+                            defaults=(False,))
+# The confidence of a provisional detection, from the recognizer's final result
+Confirmation = namedtuple("Confirmation", ["word", "source", "confidence"])
+
+DEFAULT_SOURCE = socket.gethostname()
+
+
+class WordCountStore:
+    """
+    In-memory word counts with an asynchronous, batching database writer.
+
+    Args:
+        pool: db_pool.ConnectionPool used by the writer thread
+        flush_size: Number of pending detections that triggers a flush
+        flush_interval: Maximum seconds a detection waits before flushing
+        source: Default source device recorded with each detection
+        max_pending: Detections kept while the database is unreachable; the
+            oldest are dropped beyond this
+        confirm_timeout: Seconds a provisional detection waits for its
+            confidence before it is written without one
+    """
+
+    def __init__(self, pool, flush_size=20, flush_interval=5.0, source=DEFAULT_SOURCE,
+                 max_pending=10000, confirm_timeout=10.0):
+        self.pool = pool
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.source = source
+        self.max_pending = max_pending
+        self.confirm_timeout = confirm_timeout
+        self._counts = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._pending = []
+        self._provisional = deque()  # (DetectionEvent, expiry) awaiting a Confirmation
+        self._running = False
+        self._thread = None
+
+        # Accounting
+        self.flushes = 0
+        self.flush_errors = 0
+        self.events_written = 0
+        self.events_dropped = 0
+        self.flush_latency = Histogram()
+
+    def warm(self):
+        """Load the current counts from word_counts into the cache"""
+        with self.pool.connection() as db:
+            cursor = db.cursor()
+            cursor.execute("SELECT word, count FROM word_counts")
+            rows = cursor.fetchall()
+            cursor.close()
+        with self._lock:
+            for word, count in rows:
+                self._counts[word.lower()] = count
+        print(f"Loaded counts for {len(rows)} words")
+
+    def start(self):
+        """Start the background writer"""
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="count-writer", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stop the writer after flushing everything still queued"""
+        if not self._running:
+            return
+        self._running = False
+        self._queue.put(None)
+        self._thread.join(timeout=10)
+
+    def record(self, word, confidence=None, source=None, detected_at=None, provisional=False):
+        """
+        Count a detection and queue it for the database
+
+        Args:
+            word: Detected word
+            confidence: Recognizer confidence (0-1), if known
+            source: Source device, defaults to the store's source
+            detected_at: Unix timestamp, defaults to now
+            provisional: Hold the event until confirm() supplies its confidence
+
+        Returns:
+            The new count for the word, served from the cache
+        """
+        with self._lock:
+            count = self._counts.get(word, 0) + 1
+            self._counts[word] = count
+        self._queue.put(DetectionEvent(detected_at or time.time(), word, confidence,
+                                       source or self.source, provisional))
+        return count
+
+    def confirm(self, word, confidence, source=None):
+        """Set the confidence of the oldest provisional detection of a word"""
+        self._queue.put(Confirmation(word, source or self.source, confidence))
+
+    def get(self, word):
+        """Return the cached count for a word"""
+        with self._lock:
+            return self._counts.get(word, 0)
+
+    def _run(self):
+        deadline = None
+        while True:
+            wake = deadline
+            if self._provisional:
+                expiry = self._provisional[0][1]
+                wake = expiry if wake is None else min(wake, expiry)
+            timeout = None if wake is None else max(0.0, wake - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = ()
+
+            if item is None:
+                self._release(force=True)
+                self._flush()
+                return
+            if isinstance(item, Confirmation):
+                self._confirm(item)
+            elif item and item.provisional:
+                self._provisional.append((item, time.monotonic() + self.confirm_timeout))
+            elif item:
+                self._add(item)
+            self._release()
+
+            if self._pending and deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+            if self._pending and (len(self._pending) >= self.flush_size
+                                  or time.monotonic() >= deadline):
+                self._flush()
+                deadline = time.monotonic() + self.flush_interval if self._pending else None
+
+    def _add(self, event):
+        self._pending.append(event)
+        if len(self._pending) > self.max_pending:
+            # Database down for long: keep memory bounded, newest detections win
+            dropped = len(self._pending) - self.max_pending
+            del self._pending[:dropped]
+            self.events_dropped += dropped
+
+    def _release(self, force=False):
+        # Provisional detections never confirmed are written without a confidence
+        now = time.monotonic()
+        while self._provisional and (force or self._provisional[0][1] <= now):
+            self._add(self._provisional.popleft()[0])
+
+    def _confirm(self, confirmation):
+        for i, (event, _) in enumerate(self._provisional):
+            if event.word == confirmation.word and event.source == confirmation.source:
+                del self._provisional[i]
+                self._add(event._replace(confidence=confirmation.confidence))
+                return
+
+    def _flush(self):
+        if not self._pending:
+            return
+        events = self._pending
+        counts = Counter(event.word for event in events)
+        hourly = Counter()
+        daily = Counter()
+        rows = []
+        for event in events:
+            detected_at = datetime.fromtimestamp(event.detected_at)
+            rows.append((detected_at, event.word, event.confidence, event.source))
+            hour = detected_at.replace(minute=0, second=0, microsecond=0)
+            hourly[(hour, event.word, event.source)] += 1
+            daily[(detected_at.date(), event.word, event.source)] += 1
+
+        started = time.monotonic()
+        try:
+            # A failed transaction is never committed; the pool drops the connection
+            with self.pool.connection() as db:
+                cursor = db.cursor()
+                cursor.executemany(UPSERT_COUNT_SQL, list(counts.items()))
+                cursor.executemany(INSERT_EVENT_SQL, rows)
+                cursor.executemany(UPSERT_HOURLY_SQL, [k + (n,) for k, n in hourly.items()])
+                cursor.executemany(UPSERT_DAILY_SQL, [k + (n,) for k, n in daily.items()])
+                db.commit()
+                cursor.close()
+        except Exception as e:
+            # Keep the increments pending and retry on the next flush
+            self.flush_errors += 1
+            print(f"Failed to write word counts: {e}")
+            return
+
+        self.flush_latency.observe(time.monotonic() - started)
+        self._pending = []
+        self.flushes += 1
+        self.events_written += len(events)
+
+    def stats(self):
+        """Return writer counters"""
+        return {
+            "queued": self._queue.qsize(),
+            "pending": len(self._pending),
+            "provisional": len(self._provisional),
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "events_written": self.events_written,
+            "events_dropped": self.events_dropped,
+            "flush_latency": self.flush_latency.snapshot(),
+        }
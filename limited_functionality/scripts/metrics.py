@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Cheap metric primitives for the Raspberry Pi curse word detector.
+
+Histograms are plain lists of bucket counts updated without locks, so
+observing a value on the audio path costs a bisect and three increments.
+Under heavy contention an update can very rarely be lost, which is fine for
+monitoring. The detector turns its counters into metric families that are
+published through the status file; health_check.py renders them in the
+Prometheus text format on /metrics.
+"""
+
+import os
+import resource
+from bisect import bisect_left
+
+# Bucket upper bounds in seconds
+DECODE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram of observed values.
+
+    Args:
+        buckets: Ascending bucket upper bounds
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """Record one value"""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        """Return a JSON-serializable copy"""
+        return {"buckets": list(self.buckets), "counts": list(self.counts),
+                "sum": self.sum, "count": self.count}
+
+
+def process_stats(pid=None):
+    """
+    Return the resident memory and CPU time of a process
+
+    Args:
+        pid: Process ID, defaults to the current process
+
+    Returns:
+        {"rss_bytes", "cpu_seconds"}, or None if the process is gone
+    """
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    ticks = os.sysconf("SC_CLK_TCK")
+    proc = f"/proc/{pid or 'self'}"
+    try:
+        with open(f"{proc}/statm") as f:
+            rss = int(f.read().split()[1]) * page_size
+        with open(f"{proc}/stat") as f:
+            # Fields after the parenthesized command name; utime and stime are 14 and 15
+            fields = f.read().rsplit(")", 1)[1].split()
+        cpu = (int(fields[11]) + int(fields[12])) / ticks
+    except (OSError, IndexError, ValueError):
+        if pid is not None:
+            return None
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        rss, cpu = usage.ru_maxrss * 1024, usage.ru_utime + usage.ru_stime
+    return {"rss_bytes": rss, "cpu_seconds": round(cpu, 2)}
+
+
+class MetricFamilies:
+    """Collects metric samples grouped by name, ready for render_prometheus()"""
+
+    def __init__(self, prefix="detector_"):
+        self.prefix = prefix
+        self._families = {}
+
+    def _family(self, name, kind, help_text):
+        name = self.prefix + name
+        if name not in self._families:
+            self._families[name] = {"name": name, "type": kind, "help": help_text, "samples": []}
+        return self._families[name]
+
+    def counter(self, name, help_text, value, **labels):
+        """Add a counter sample (name should end in _total)"""
+        self._family(name, "counter", help_text)["samples"].append(["", labels, value])
+
+    def gauge(self, name, help_text, value, **labels):
+        """Add a gauge sample"""
+        if value is not None:
+            self._family(name, "gauge", help_text)["samples"].append(["", labels, value])
+
+    def histogram(self, name, help_text, snapshot, **labels):
+        """Add a Histogram.snapshot()"""
+        if not snapshot:
+            return
+        samples = self._family(name, "histogram", help_text)["samples"]
+        cumulative = 0
+        for bound, count in zip(snapshot["buckets"] + ["+Inf"], snapshot["counts"]):
+            cumulative += count
+            samples.append(["_bucket", dict(labels, le=str(bound)), cumulative])
+        samples.append(["_sum", labels, snapshot["sum"]])
+        samples.append(["_count", labels, snapshot["count"]])
+
+    def families(self):
+        """Return the collected families as a JSON-serializable list"""
+        return list(self._families.values())
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render_prometheus(families):
+    """Render MetricFamilies.families() output in the Prometheus text format"""
+    lines = []
+    for family in families:
+        lines.append(f"# HELP {family['name']} {family['help']}")
+        lines.append(f"# TYPE {family['name']} {family['type']}")
+        for suffix, labels, value in family["samples"]:
+            label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in sorted(labels.items()))
+            label_text = f"{{{label_text}}}" if label_text else ""
+            lines.append(f"{family['name']}{suffix}{label_text} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Speech recognizer setup for the Raspberry Pi curse word detector.
+
+In keyword-spotting mode the Vosk recognizer decodes against a tiny grammar
+made of the configured curse words plus an "[unk]" garbage class, instead of
+the model's full open vocabulary. This is much cheaper per chunk and makes
+smaller chunk sizes practical.
+
+KeywordStream feeds audio chunks to a recognizer and turns its results into
+keyword detections, optionally firing early from stable partial hypotheses.
+"""
+
+import json
+from collections import Counter, deque, namedtuple
+
+from vosk import KaldiRecognizer
+
+RECOGNIZER_MODES = ("keywords", "full")
+UNKNOWN_WORD = "[unk]"
+
+# A keyword hit: the matched word, the transcript it came from, whether it
+# was fired from a partial hypothesis, the matcher path ("exact"/"phonetic")
+# and the recognizer confidence (None for partial hypotheses). A hit fired
+# from a partial is reported again from the final result with confirms=True,
+# carrying its confidence; a confirmation is not a new detection.
+Detection = namedtuple("Detection", ["word", "text", "partial", "path", "confidence", "confirms"],
+                       defaults=(False,))
+
+
+def build_grammar(words):
+    """
+    Build a Vosk grammar from the configured words
+
+    Args:
+        words: Iterable of words or multi-word phrases
+
+    Returns:
+        JSON-encoded phrase list ending with the "[unk]" garbage class
+    """
+    phrases = []
+    for word in words:
+        phrase = " ".join(word.lower().split())
+        if phrase and phrase not in phrases:
+            phrases.append(phrase)
+    phrases.append(UNKNOWN_WORD)
+    return json.dumps(phrases)
+
+
+def create_recognizer(model, sample_rate, words, mode="keywords"):
+    """
+    Create a KaldiRecognizer for the given mode
+
+    Args:
+        model: Loaded vosk.Model
+        sample_rate: Audio sample rate in Hz
+        words: Words to spot in keyword mode
+        mode: "keywords" for a restricted grammar, "full" for the open vocabulary
+
+    Returns:
+        KaldiRecognizer instance
+    """
+    if mode not in RECOGNIZER_MODES:
+        raise ValueError(f"Unknown recognizer mode '{mode}', expected one of {RECOGNIZER_MODES}")
+
+    if mode == "full":
+        recognizer = KaldiRecognizer(model, sample_rate)
+    else:
+        # Models with a static decoding graph ignore the grammar and log a warning,
+        # in which case Vosk silently decodes with the full vocabulary
+        recognizer = KaldiRecognizer(model, sample_rate, build_grammar(words))
+
+    # Per-word confidences in final results
+    recognizer.SetWords(True)
+    return recognizer
+
+
+class KeywordStream:
+    """
+    Turns recognizer output into keyword detections.
+
+    With partial results enabled, a keyword fires as soon as it has been
+    present in `partial_stability` consecutive partial hypotheses of the
+    current utterance. When the final result for that utterance arrives, only
+    occurrences that were not already fired from partials are reported as new
+    detections; the others come back as confirmations with their confidence.
+
+    Args:
+        recognizer: KaldiRecognizer instance
+        match: Callable taking a transcript and returning keyword_matcher.Match
+            tuples in spoken order
+        use_partials: Fire on stable partial hypotheses
+        partial_stability: Consecutive partials a keyword must appear in
+    """
+
+    def __init__(self, recognizer, match, use_partials=False, partial_stability=2):
+        self.recognizer = recognizer
+        self.match = match
+        self.use_partials = use_partials
+        self.partial_stability = max(1, partial_stability)
+        self.last_utterance_hits = 0
+        self._fired = Counter()
+        self._recent = deque(maxlen=self.partial_stability)
+
+    def accept(self, data):
+        """
+        Feed one audio chunk
+
+        Returns:
+            (final_text, detections) where final_text is the transcript of a
+            just-finished utterance (None otherwise) and detections is a list
+            of new Detection tuples
+        """
+        if self.recognizer.AcceptWaveform(data):
+            return self._final_result(self.recognizer.Result())
+
+        if self.use_partials:
+            partial = json.loads(self.recognizer.PartialResult()).get("partial", "").lower()
+            return None, self._update_partial(partial)
+
+        return None, []
+
+    def flush(self):
+        """
+        End the current utterance, e.g. at the end of a recording
+
+        Returns:
+            (final_text, detections) for whatever audio was still pending
+        """
+        return self._final_result(self.recognizer.FinalResult())
+
+    def _final_result(self, result_json):
+        result = json.loads(result_json)
+        text = result.get("text", "").lower()
+        confidences = [word.get("conf") for word in result.get("result", [])]
+        return text, self._finalize(text, confidences)
+
+    def _update_partial(self, partial):
+        matches = self.match(partial) if partial else []
+        self._recent.append(Counter(m.term for m in matches))
+        if len(self._recent) < self.partial_stability:
+            return []
+
+        paths = {m.term: m.path for m in matches}
+        detections = []
+        for word in self._recent[-1]:
+            stable = min(counts[word] for counts in self._recent)
+            for _ in range(stable - self._fired[word]):
+                detections.append(Detection(word, partial, True, paths[word], None))
+            self._fired[word] = max(self._fired[word], stable)
+        return detections
+
+    def _finalize(self, text, confidences):
+        # Confidences line up with transcript tokens when Vosk returned word details
+        if len(confidences) != len(text.split()):
+            confidences = None
+
+        detections = []
+        new = 0
+        seen = Counter()
+        for m in self.match(text):
+            seen[m.term] += 1
+            confidence = min(confidences[m.start:m.end]) if confidences else None
+            if seen[m.term] > self._fired[m.term]:
+                detections.append(Detection(m.term, text, False, m.path, confidence))
+                new += 1
+            else:
+                detections.append(Detection(m.term, text, True, m.path, confidence, confirms=True))
+
+        self.last_utterance_hits = sum(self._fired.values()) + new
+        self._fired.clear()
+        self._recent.clear()
+        return detections
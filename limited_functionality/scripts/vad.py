@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Voice activity detection gate for the Raspberry Pi curse word detector.
+
+Each chunk is split into short frames and classified with vectorized NumPy
+energy and zero-crossing-rate measurements. Only speech-bearing chunks, a
+short pre-roll before them and a hangover after them are passed on to the
+recognizer; silent audio is skipped entirely.
+"""
+
+import math
+from collections import deque
+
+import numpy as np
+
+
+class VoiceActivityGate:
+    """
+    Energy/zero-crossing VAD with hangover and pre-roll.
+
+    Args:
+        sample_rate: Audio sample rate in Hz
+        frame_ms: Analysis frame length in milliseconds
+        energy_margin_db: How far above the tracked noise floor a frame must be
+        min_energy_db: Absolute energy floor (dBFS) below which frames are silent
+        max_zcr: Frames with a higher zero-crossing rate are treated as noise
+        min_speech_ratio: Fraction of speech frames that makes a chunk speech
+        hangover_ms: Audio passed through after the last speech chunk, so the
+            recognizer sees the trailing silence it needs to end an utterance
+        preroll_ms: Audio passed through before the first speech chunk
+        noise_window_ms: The noise floor is the quietest level seen over this
+            long, so it follows steady background noise such as a hum
+    """
+
+    def __init__(self, sample_rate=16000, frame_ms=20, energy_margin_db=10.0,
+                 min_energy_db=-55.0, max_zcr=0.35, min_speech_ratio=0.2,
+                 hangover_ms=1000, preroll_ms=500, noise_window_ms=5000):
+        self.frame_samples = int(sample_rate * frame_ms / 1000)
+        self.sample_rate = sample_rate
+        self.energy_margin_db = energy_margin_db
+        self.min_energy_db = min_energy_db
+        self.max_zcr = max_zcr
+        self.min_speech_ratio = min_speech_ratio
+        self.hangover_ms = hangover_ms
+        self.preroll_ms = preroll_ms
+        self.noise_window_ms = noise_window_ms
+        self.noise_floor_db = min_energy_db
+        self._quiet_levels = None  # per-chunk quiet level over the noise window
+
+        self._preroll = deque()
+        self._preroll_chunks = 0
+        self._hangover_chunks = 0
+        self._hangover_left = 0
+
+        # Accounting
+        self.chunks_in = 0
+        self.chunks_passed = 0
+        self.speech_chunks = 0
+
+    def is_speech(self, data):
+        """Classify one chunk of 16-bit mono PCM"""
+        samples = np.frombuffer(data, dtype=np.int16)
+        usable = len(samples) - len(samples) % self.frame_samples
+        if usable == 0:
+            return False
+        frames = samples[:usable].reshape(-1, self.frame_samples).astype(np.float32)
+
+        power = np.mean(frames * frames, axis=1) / (32768.0 * 32768.0)
+        energy_db = 10.0 * np.log10(power + 1e-10)
+        signs = np.signbit(frames)
+        zcr = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+
+        # Minimum statistics: the floor is the quietest chunk level over the
+        # window, updated from every chunk so a steady hum raises it too, while
+        # the pauses between words keep it down during speech
+        if self._quiet_levels is None:
+            chunk_ms = 1000.0 * len(samples) / self.sample_rate
+            self._quiet_levels = deque(maxlen=max(1, math.ceil(self.noise_window_ms / chunk_ms)))
+        self._quiet_levels.append(float(np.percentile(energy_db, 20)))
+        self.noise_floor_db = min(self._quiet_levels)
+
+        threshold = max(self.min_energy_db, self.noise_floor_db + self.energy_margin_db)
+        voiced = (energy_db > threshold) & (zcr < self.max_zcr)
+        return bool(np.mean(voiced) >= self.min_speech_ratio)
+
+    def process(self, data, timestamp):
+        """
+        Gate one chunk
+
+        Returns:
+            List of (data, timestamp) chunks to feed to the recognizer, which
+            includes any buffered pre-roll when speech starts
+        """
+        if not self._hangover_chunks:
+            chunk_ms = 1000.0 * len(data) / 2 / self.sample_rate
+            self._hangover_chunks = max(1, math.ceil(self.hangover_ms / chunk_ms))
+            self._preroll_chunks = math.ceil(self.preroll_ms / chunk_ms)
+
+        self.chunks_in += 1
+        if self.is_speech(data):
+            self.speech_chunks += 1
+            self._hangover_left = self._hangover_chunks
+            out = list(self._preroll)
+            out.append((data, timestamp))
+            self._preroll.clear()
+        elif self._hangover_left:
+            self._hangover_left -= 1
+            out = [(data, timestamp)]
+        else:
+            if self._preroll_chunks:
+                self._preroll.append((data, timestamp))
+                while len(self._preroll) > self._preroll_chunks:
+                    self._preroll.popleft()
+            out = []
+
+        self.chunks_passed += len(out)
+        return out
+
+    def stats(self):
+        """Return gate counters and the fraction of audio skipped"""
+        skipped = 1.0 - self.chunks_passed / self.chunks_in if self.chunks_in else 0.0
+        return {
+            "chunks_in": self.chunks_in,
+            "chunks_passed": self.chunks_passed,
+            "speech_chunks": self.speech_chunks,
+            "skipped_fraction": round(skipped, 3),
+            "noise_floor_db": round(self.noise_floor_db, 1),
+        }
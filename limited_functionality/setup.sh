@@ -30,18 +30,18 @@ python3 -m venv $VENV_DIR
 # Install Python dependencies in the virtual environment
 echo "Installing Python packages..."
 $VENV_DIR/bin/pip install --upgrade pip
-$VENV_DIR/bin/pip install pyaudio vosk mariadb python-dotenv
+$VENV_DIR/bin/pip install pyaudio vosk mariadb python-dotenv numpy
 
 # Copy files to project directory
 cp config.env $PROJECT_DIR/
 cp curse_word_detector.py $PROJECT_DIR/
-cp scripts/play_audio.py $PROJECT_DIR/scripts/
+cp scripts/*.py $PROJECT_DIR/scripts/
 cp database_setup.sql $PROJECT_DIR/
 cp setup_database.sh $PROJECT_DIR/
 
 # Make scripts executable
 chmod +x $PROJECT_DIR/setup_database.sh
-chmod +x $PROJECT_DIR/scripts/play_audio.py
+chmod +x $PROJECT_DIR/scripts/*.py
 
 # Configure MariaDB
 echo "Configuring MariaDB..."
@@ -3,120 +3,108 @@
 UniFi CloudKey+ Integration: Device Blocking Tool
 
 This script blocks network access for a device by its MAC address using the UniFi CloudKey+ API.
-It authenticates with the UniFi Controller, obtains a session cookie and CSRF token,
-then sends a block-sta command to the station manager API.
+The work is done by unifi_client.UniFiClient, which logs in once and reuses the session
+cookie and CSRF token; importing this module exposes block_device() for in-process use.
 
 Usage:
-    python block_device.py [mac_address]
+    python block_device.py [mac_address_or_group ...]
     
-    If mac_address is not provided, it will be read from the CHILD_DEVICE_MAC environment variable.
+    Arguments may be MAC addresses or device group names (DEVICE_GROUP_<NAME> in config.env).
+    If none are provided, every configured device (CHILD_DEVICE_MACS or CHILD_DEVICE_MAC, plus
+    all device groups) is blocked. Several devices are blocked concurrently over one session.
 """
 
-import requests
 import os
 import sys
 from pathlib import Path
 import dotenv
 
-# Try to find and load the config.env file
+from unifi_client import UniFiError, get_client, resolve_targets
 
 
+# Try to find and load the config.env file
 def load_environment():
     # Check for config.env in the current directory
     local_env = Path("config.env")
     if local_env.exists():
         dotenv.load_dotenv(local_env)
         return True
-
+    
     # Check for config.env in the docker directory
     docker_env = Path("../config.env")
     if docker_env.exists():
         dotenv.load_dotenv(docker_env)
         return True
-
+    
     # Check one more level up
     root_env = Path("../../docker/config.env")
     if root_env.exists():
         dotenv.load_dotenv(root_env)
         return True
-
+    
     return False
 
 
-# Make a best effort to load environment variables
-if not load_environment():
-    print("Warning: Could not find config.env file. Using default values.")
-
-# Configuration from environment variables
-controller_host = os.getenv("UNIFI_CONTROLLER", "unifi.example.com")
-username = os.getenv("UNIFI_USERNAME", "admin")
-password = os.getenv("UNIFI_PASSWORD", "yourpassword")
-site = os.getenv("UNIFI_SITE", "default")
-device_mac = os.getenv("CHILD_DEVICE_MAC", "AA:BB:CC:DD:EE:FF")
-ssl_verify = os.getenv("UNIFI_SSL_VERIFY", "true").lower() == "true"
-
-# Accept an optional MAC address as command-line argument
-if len(sys.argv) > 1:
-    device_mac = sys.argv[1]
-
-# Create a session for persistent cookies
-session = requests.Session()
-session.headers.update(
-    {"Content-Type": "application/json", "Accept": "application/json"})
-# Verify SSL certificates (can be disabled via environment variable, but not recommended)
-session.verify = ssl_verify
-
-# 1. Authenticate to get session cookie (and CSRF token)
-login_url = f"https://{controller_host}/api/auth/login"
-credentials = {"username": username, "password": password}
-try:
-    resp = session.post(login_url, json=credentials, timeout=10)
-    resp.raise_for_status()
-except requests.exceptions.RequestException as err:
-    print(f"Failed to connect or authenticate: {err}")
-    exit(1)
-
-# Check login response for success
-if resp.status_code != 200 or resp.json().get("meta", {}).get("rc") == "error":
-    # Authentication failed (could be wrong credentials)
-    msg = resp.json().get("meta", {}).get("msg", "") if resp.headers.get(
-        "Content-Type", "").startswith("application/json") else resp.text
-    print(f"Login failed. Server response: {msg or resp.status_code}")
-    exit(1)
-
-# Store CSRF token if provided (required for subsequent POST commands in newer UniFi versions)
-csrf_token = resp.headers.get("X-CSRF-Token")
-if csrf_token:
-    session.headers.update({"X-CSRF-Token": csrf_token})
-
-# 2. Block the device
-block_url = f"https://{controller_host}/proxy/network/api/s/{site}/cmd/stamgr"
-# ensure MAC is lower-case
-payload = {"cmd": "block-sta", "mac": device_mac.lower()}
-try:
-    resp = session.post(block_url, json=payload, timeout=10)
-    resp.raise_for_status()
-except requests.exceptions.Timeout:
-    print("Error: Request to block device timed out")
-    exit(1)
-except requests.exceptions.HTTPError as http_err:
-    # HTTP status error (e.g., 401 Unauthorized, 404 Not Found)
-    print(f"Error: Block request HTTP {
-          http_err.response.status_code} - {http_err.response.text}")
-    exit(1)
-except requests.exceptions.RequestException as err:
-    # Other errors (connection issues, SSL errors, etc.)
-    print(f"Error: Failed to send block request - {err}")
-    exit(1)
-
-# Parse response JSON to check if the command succeeded
-result = resp.json()
-if result.get("meta", {}).get("rc") == "ok":
-    print(f"Device {device_mac} has been *blocked* successfully.")
-else:
-    error_message = result.get("meta", {}).get("msg", "Unknown error")
-    print(f"Failed to block device {
-          device_mac}. Controller error: {error_message}")
+def block_device(device_mac=None, client=None):
+    """
+    Block a device on the UniFi controller
+
+    Args:
+        device_mac: MAC address (defaults to CHILD_DEVICE_MAC)
+        client: UniFiClient to use (defaults to the shared process-wide client)
 
-# (Optional) Logout to clean up session on controller
-session.post(f"https://{controller_host}/proxy/network/api/logout", timeout=5)
+    Returns:
+        Boolean indicating success
+    """
+    if device_mac is None:
+        device_mac = os.getenv("CHILD_DEVICE_MAC", "AA:BB:CC:DD:EE:FF")
+    if client is None:
+        client = get_client()
+
+    try:
+        client.block(device_mac)
+    except UniFiError as err:
+        print(f"Failed to block device {device_mac}. {err}")
+        return False
+
+    print(f"Device {device_mac} has been *blocked* successfully.")
+    return True
+
+
+def block_devices(targets=None, client=None, deadline=None):
+    """
+    Block several devices concurrently
+
+    Args:
+        targets: MAC addresses and/or device group names (defaults to every configured device)
+        client: UniFiClient to use (defaults to the shared process-wide client)
+        deadline: Seconds to wait for all devices (defaults to BLOCK_DEADLINE)
+
+    Returns:
+        Boolean indicating whether every device was blocked
+    """
+    if client is None:
+        client = get_client()
+    if deadline is None:
+        deadline = float(os.getenv("BLOCK_DEADLINE", "30"))
+
+    results = client.block_many(resolve_targets(targets), deadline=deadline)
+    for mac, error in results.items():
+        if error is None:
+            print(f"Device {mac} has been *blocked* successfully.")
+        else:
+            print(f"Failed to block device {mac}. {error}")
+    return bool(results) and all(error is None for error in results.values())
+
+
+if __name__ == "__main__":
+    # Make a best effort to load environment variables
+    if not load_environment():
+        print("Warning: Could not find config.env file. Using default values.")
+
+    # Accept optional MAC addresses or group names as command-line arguments
+    success = block_devices(sys.argv[1:])
+
+    # (Optional) Logout to clean up session on controller
+    get_client().logout()
+    sys.exit(0 if success else 1)
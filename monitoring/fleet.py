@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Fleet monitoring for many Raspberry Pi detectors.
+
+Every Pi is a Node in one table keyed by its name. Heartbeats update the
+node they identify, and the liveness checks of all nodes run concurrently on
+a single asyncio event loop, so hundreds of nodes cost one thread. Each node
+has a phi-accrual failure detector that learns its heartbeat timing: past
+the warn threshold the node is suspect, past the block threshold (or the
+warn threshold while probes fail too) it is declared offline and its own
+block targets are blocked.
+
+Heartbeats arrive over HTTP (pi_monitor's /heartbeat route) or, when a
+shared key is configured, as signed UDP datagrams received on the same loop.
+A heartbeat is matched by node name, then by sender address; only signed
+heartbeats can add new nodes to the table.
+"""
+
+import asyncio
+import os
+import threading
+import time
+
+from heartbeat_protocol import decode, SequenceTracker
+from phi_accrual import PhiAccrualDetector
+from probes import Prober
+
+
+def parse_nodes(value):
+    """
+    Parse a PI_NODES setting such as "kitchen=192.168.1.50,den=192.168.1.51"
+
+    Returns:
+        List of (name, address) pairs; an entry without "=" is used as both
+    """
+    nodes = []
+    for entry in value.split(","):
+        if not entry.strip():
+            continue
+        name, _, address = entry.partition("=")
+        nodes.append((name.strip().lower(), (address or name).strip()))
+    return nodes
+
+
+def node_block_targets(name, default=None):
+    """Return the block targets of a node from NODE_BLOCK_TARGETS_<NAME>"""
+    value = os.getenv(f"NODE_BLOCK_TARGETS_{name.upper()}")
+    if value is None:
+        return default
+    return [t.strip() for t in value.split(",") if t.strip()]
+
+
+class Node:
+    """
+    Liveness state of one Pi.
+
+    Args:
+        name: Node identity sent with its heartbeats
+        address: IP or host name used for probes (None if unknown)
+        block_targets: Device MACs/groups to block when the node goes offline
+            ([] blocks every configured device, None only sends an alert)
+        detector: phi_accrual.PhiAccrualDetector for its heartbeats
+    """
+
+    def __init__(self, name, address=None, block_targets=None, detector=None):
+        self.name = name
+        self.address = address
+        self.block_targets = block_targets
+        self.detector = detector or PhiAccrualDetector(30)
+        self.status = "online"
+        self.phi = 0.0
+        self.last_heartbeat = time.time()
+        self.heartbeats = 0
+        self.last_check = None
+        self.next_probe = 0.0
+        self.probing = False
+        self.digest = None  # health digest from the last UDP heartbeat
+        self.sequence = None  # heartbeat_protocol.SequenceTracker once UDP heartbeats arrive
+        self.reachable = None
+        self.last_rtt = None
+        self.smoothed_rtt = None
+
+    def heartbeat(self, address=None):
+        """Record a heartbeat from this node"""
+        self.last_heartbeat = time.time()
+        self.heartbeats += 1
+        self.detector.heartbeat()
+        if address and not self.address:
+            self.address = address
+
+    def probed(self, rtt):
+        """Record a probe result (round trip seconds, or None for no answer)"""
+        self.last_check = time.time()
+        self.reachable = rtt is not None
+        self.last_rtt = rtt
+        if rtt is not None:
+            # Smoothed like TCP's SRTT, so one slow answer does not dominate
+            self.smoothed_rtt = rtt if self.smoothed_rtt is None else 0.875 * self.smoothed_rtt + 0.125 * rtt
+
+    def snapshot(self):
+        """Return the node state for the status endpoint"""
+        return {
+            "status": self.status,
+            "address": self.address,
+            "last_heartbeat": self.last_heartbeat,
+            "seconds_ago": round(time.time() - self.last_heartbeat, 1),
+            "heartbeats": self.heartbeats,
+            **self.detector.snapshot(),
+            "reachable": self.reachable,
+            "last_rtt_ms": round(self.last_rtt * 1000, 2) if self.last_rtt is not None else None,
+            "smoothed_rtt_ms": round(self.smoothed_rtt * 1000, 2) if self.smoothed_rtt is not None else None,
+            "block_targets": self.block_targets,
+            "digest": self.digest,
+            "udp": self.sequence.stats() if self.sequence else None,
+        }
+
+
+class HeartbeatListener(asyncio.DatagramProtocol):
+    """
+    Receives signed UDP heartbeats for a FleetMonitor.
+
+    Args:
+        fleet: FleetMonitor to record heartbeats in
+        key: Shared HEARTBEAT_KEY (bytes)
+    """
+
+    def __init__(self, fleet, key):
+        self.fleet = fleet
+        self.key = key
+        self.received = 0
+        self.rejected = 0
+
+    def datagram_received(self, data, address):
+        self.received += 1
+        try:
+            heartbeat = decode(self.key, data)
+        except ValueError:
+            self.rejected += 1
+            return
+        self.fleet.udp_heartbeat(heartbeat, address[0])
+
+    def stats(self):
+        """Return datagram counters"""
+        return {"received": self.received, "rejected": self.rejected}
+
+
+class FleetMonitor:
+    """
+    Watches every node from one asyncio loop.
+
+    Suspicion is re-evaluated every check_interval, which costs a few
+    arithmetic operations per node; probes run once per interval as
+    concurrent tasks.
+
+    Args:
+        interval: Nominal seconds between heartbeats, also the probe period
+        warn_phi: Suspicion at which a node is marked suspect
+        block_phi: Suspicion at which a node is declared offline
+        on_offline: Called as on_offline(node) in a worker thread
+        prober: probes.Prober used for liveness checks
+        detector_settings: Keyword arguments for each node's PhiAccrualDetector
+        check_interval: Seconds between suspicion evaluations
+        max_concurrent_probes: Upper bound on probes in flight
+        udp_key: Shared key (bytes) enabling the UDP heartbeat listener
+        udp_port: Port of the UDP heartbeat listener
+        udp_interval: Seconds between a Pi's UDP heartbeats; a restarted Pi's
+            new epoch is accepted after three intervals of silence
+    """
+
+    def __init__(self, interval=30, warn_phi=5.0, block_phi=8.0, on_offline=None, prober=None,
+                 detector_settings=None, check_interval=1.0, max_concurrent_probes=32,
+                 udp_key=None, udp_port=5001, udp_interval=1.0):
+        self.interval = interval
+        self.warn_phi = warn_phi
+        self.block_phi = block_phi
+        self.on_offline = on_offline
+        self.prober = prober or Prober()
+        self.detector_settings = detector_settings or {}
+        self.check_interval = check_interval
+        self.max_concurrent_probes = max_concurrent_probes
+        self.udp_key = udp_key
+        self.udp_port = udp_port
+        self.udp_interval = udp_interval
+        self.listener = None
+        self.nodes = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add_node(self, name, address=None, block_targets=None):
+        """Add a node to the table, or return the existing one"""
+        with self._lock:
+            node = self.nodes.get(name)
+            if node is None:
+                detector = PhiAccrualDetector(self.interval, **self.detector_settings)
+                node = Node(name, address, block_targets, detector)
+                self.nodes[name] = node
+            return node
+
+    def find(self, name=None, address=None):
+        """Look a node up by name, falling back to its address"""
+        node = self.nodes.get(name.lower()) if name else None
+        if node is not None or not address:
+            return node
+        for node in list(self.nodes.values()):
+            if node.address == address:
+                return node
+        return None
+
+    def heartbeat(self, name=None, address=None):
+        """
+        Record an unauthenticated (HTTP) heartbeat from a node in the table
+
+        Returns:
+            The Node, or None if the sender could not be identified
+        """
+        node = self.find(name, address)
+        if node is not None:
+            node.heartbeat(address)
+        return node
+
+    def udp_heartbeat(self, heartbeat, address):
+        """
+        Record a verified heartbeat_protocol datagram, ignoring duplicates and
+        replays; unknown senders are added to the table and only block devices
+        if NODE_BLOCK_TARGETS_<NAME> is set for them
+        """
+        node = self._sender(heartbeat["node"], address)
+        if node is None:
+            return
+        if node.sequence is None:
+            node.sequence = SequenceTracker(switch_after=3 * self.udp_interval)
+        if not node.sequence.accept(heartbeat["epoch"], heartbeat["seq"]):
+            return
+        if node.digest and node.digest["alive"] and not heartbeat["digest"]["alive"]:
+            print(f"Node {node.name} reports its detector is not running")
+        node.digest = heartbeat["digest"]
+        node.heartbeat(address)
+
+    def _sender(self, name, address):
+        node = self.find(name, address)
+        if node is None and name:
+            node = self.add_node(name.lower(), address, node_block_targets(name))
+            print(f"New node {node.name} at {address}")
+        return node
+
+    def start(self):
+        """Run the check loop on its own thread"""
+        self._thread = threading.Thread(target=asyncio.run, args=(self._run(),),
+                                        name="fleet-monitor", daemon=True)
+        self._thread.start()
+
+    async def _run(self):
+        self._probe_slots = asyncio.Semaphore(self.max_concurrent_probes)
+        print(f"Probing nodes over {self.prober.open()}")
+        loop = asyncio.get_running_loop()
+        if self.udp_key:
+            _, self.listener = await loop.create_datagram_endpoint(
+                lambda: HeartbeatListener(self, self.udp_key), local_addr=("0.0.0.0", self.udp_port))
+            print(f"Listening for UDP heartbeats on port {self.udp_port}")
+        while True:
+            now = loop.time()
+            for node in list(self.nodes.values()):
+                # Start due probes without waiting for them
+                if node.address and not node.probing and now >= node.next_probe:
+                    node.probing = True
+                    node.next_probe = now + self.interval
+                    loop.create_task(self._probe(node))
+                self._evaluate(node, loop)
+            await asyncio.sleep(self.check_interval)
+
+    async def _probe(self, node):
+        try:
+            async with self._probe_slots:
+                node.probed(await self.prober.probe(node.address))
+        finally:
+            node.probing = False
+
+    def _evaluate(self, node, loop):
+        node.phi = phi = node.detector.phi()
+
+        # Heartbeats overdue, or somewhat overdue while the host does not answer probes
+        if phi >= self.block_phi or (phi >= self.warn_phi and node.reachable is False):
+            if node.status != "offline":
+                print(f"Node {node.name} confirmed offline (phi {phi:.1f}, "
+                      f"reachable {node.reachable}). Taking action...")
+                node.status = "offline"
+                if self.on_offline:
+                    loop.run_in_executor(None, self.on_offline, node)
+        elif phi >= self.warn_phi:
+            if node.status == "online":
+                print(f"Node {node.name} suspected (phi {phi:.1f}), last heartbeat "
+                      f"{time.time() - node.last_heartbeat:.0f}s ago")
+            node.status = "suspect"
+        else:
+            if node.status != "online":
+                print(f"Node {node.name} connection restored")
+            node.status = "online"
+
+    def snapshot(self):
+        """Return every node's state"""
+        return {name: node.snapshot() for name, node in list(self.nodes.items())}
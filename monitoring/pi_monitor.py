@@ -1,11 +1,7 @@
 import os
-import time
 import requests
-import subprocess
-import sys
-import threading
 from pathlib import Path
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request
 import dotenv
 
 
@@ -51,84 +47,54 @@ EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD", "your-email-password")
 TO_EMAIL = os.getenv("TO_EMAIL", "parent-email@example.com")
 SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
 SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+BLOCK_DEADLINE = float(os.getenv("BLOCK_DEADLINE", "30"))
+# Signed UDP heartbeats are accepted when a shared key is set
+HEARTBEAT_KEY = os.getenv("HEARTBEAT_KEY", "")
+HEARTBEAT_UDP_PORT = int(os.getenv("HEARTBEAT_UDP_PORT", "5001"))
+HEARTBEAT_UDP_INTERVAL = float(os.getenv("HEARTBEAT_UDP_INTERVAL", "1"))
+# Phi-accrual suspicion levels for marking a Pi suspect and for blocking
+PHI_WARN = float(os.getenv("PHI_WARN", "5"))
+PHI_BLOCK = float(os.getenv("PHI_BLOCK", "8"))
+PHI_WINDOW = int(os.getenv("PHI_WINDOW", "100"))
+PHI_MIN_STD = float(os.getenv("PHI_MIN_STD") or HEARTBEAT_INTERVAL / 10)
+PHI_ACCEPTABLE_PAUSE = float(os.getenv("PHI_ACCEPTABLE_PAUSE", "0"))
+MAX_CONCURRENT_PROBES = int(os.getenv("MAX_CONCURRENT_PROBES", "32"))
+# Liveness probes: icmp, tcp (connect to the Pi's health check port) or auto
+PROBE_METHOD = os.getenv("PROBE_METHOD", "auto").lower()
+PROBE_TIMEOUT = float(os.getenv("PROBE_TIMEOUT", "1"))
+PROBE_PORT = int(os.getenv("PROBE_PORT", "5000"))
+
+# Pis to watch as name=ip pairs; a single PI_IP is the node "pi"
+PI_NODES = os.getenv("PI_NODES", "") or f"pi={PI_IP}"
+BLOCK_TARGETS = [t.strip() for t in os.getenv("BLOCK_TARGETS", "").split(",") if t.strip()]
+
+# UniFi blocking helpers and the fleet table live next to this script
+from block_device import block_devices
+from fleet import FleetMonitor, parse_nodes, node_block_targets
+from probes import Prober
 
 
 # Create Flask app
 app = Flask(__name__)
-last_heartbeat = time.time()
-pi_status = "online"  # Track overall Pi status
 
 
-def ping(host):
+def block_device(node):
     """
-    Returns True if host responds to a ping request
+    Blocks the node's target devices in-process over one controller session
     """
-    # Check OS and use appropriate ping command
-    if sys.platform.lower() == "win32":
-        ping_cmd = ["ping", "-n", "1", host]
-    else:
-        ping_cmd = ["ping", "-c", "1", host]
-    
-    try:
-        return subprocess.call(ping_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) == 0
-    except Exception as e:
-        print(f"Error pinging {host}: {e}")
+    if node.block_targets is None:
+        print(f"No block targets configured for node {node.name}")
         return False
-
-
-def block_device():
-    """
-    Blocks the target device by calling the block_device.py script
-    """
-    # Get the directory of this script
-    current_dir = Path(__file__).parent.absolute()
-    
-    # Find the block_device.py script
-    script_paths = [
-        current_dir / "block_device.py",
-        current_dir / "../docker/scripts/block_device.py",
-        Path("/app/scripts/block_device.py")  # For Docker environment
-    ]
-    
-    script_path = None
-    for path in script_paths:
-        if path.exists():
-            script_path = path
-            break
-    
-    if not script_path:
-        print("Error: Could not find block_device.py script")
-        return False
-    
     try:
-        # Run the block_device.py script
-        child_mac = os.getenv("CHILD_DEVICE_MAC", "")
-        cmd = [sys.executable, str(script_path)]
-        if child_mac:
-            cmd.append(child_mac)
-            
-        result = subprocess.run(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            check=False
-        )
-        
-        if result.returncode == 0:
-            print(f"Device blocked successfully: {result.stdout.strip()}")
-            return True
-        else:
-            print(f"Failed to block device: {result.stderr.strip()}")
-            return False
+        return block_devices(node.block_targets, deadline=BLOCK_DEADLINE)
     except Exception as e:
-        print(f"Failed to execute block_device.py: {e}")
+        print(f"Failed to block devices: {e}")
         return False
 
 
-def send_alert():
+def send_alert(node):
     """
-    Send email notification about Pi being offline
+    Send email notification about a Pi being offline
     """
     import smtplib
     
@@ -136,7 +102,9 @@ def send_alert():
         with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
             server.starttls()
             server.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
-            msg = "Subject: Alert! Raspberry Pi Disconnected\n\nThe Raspberry Pi has stopped sending heartbeats. Child's device is now permanently blocked."
+            msg = (f"Subject: Alert! Raspberry Pi {node.name} Disconnected\n\n"
+                   f"The Raspberry Pi {node.name} ({node.address}) has stopped sending heartbeats. "
+                   f"Child's device is now permanently blocked.")
             server.sendmail(EMAIL_ADDRESS, TO_EMAIL, msg)
             print("Alert email sent!")
             return True
@@ -145,82 +113,77 @@ def send_alert():
         return False
 
 
+def node_offline(node):
+    """
+    Block the node's devices and send an alert (runs in a worker thread)
+    """
+    # Block device
+    if block_device(node):
+        print(f"Child device blocked successfully for node {node.name}")
+    else:
+        print(f"Failed to block child device for node {node.name}")
+    
+    # Send alert
+    send_alert(node)
+
+
+# One table of Pis, checked concurrently on an asyncio loop
+prober = Prober(method=PROBE_METHOD, timeout=PROBE_TIMEOUT, tcp_port=PROBE_PORT)
+fleet = FleetMonitor(interval=HEARTBEAT_INTERVAL, warn_phi=PHI_WARN, block_phi=PHI_BLOCK,
+                     on_offline=node_offline, prober=prober,
+                     detector_settings={"window": PHI_WINDOW, "min_std": PHI_MIN_STD,
+                                        "acceptable_pause": PHI_ACCEPTABLE_PAUSE},
+                     max_concurrent_probes=MAX_CONCURRENT_PROBES,
+                     udp_key=HEARTBEAT_KEY.encode() or None, udp_port=HEARTBEAT_UDP_PORT,
+                     udp_interval=HEARTBEAT_UDP_INTERVAL)
+for name, address in parse_nodes(PI_NODES):
+    fleet.add_node(name, address, node_block_targets(name, BLOCK_TARGETS))
+
+
 @app.route('/heartbeat', methods=['POST'])
 def heartbeat():
     """
-    Endpoint to receive heartbeats from the Pi
+    Endpoint to receive heartbeats from the Pis
+    
+    The sender names itself with {"node": "<name>"}; an unknown or missing
+    name is matched by its IP address. Only nodes in PI_NODES are accepted.
     """
-    global last_heartbeat, pi_status
-    last_heartbeat = time.time()
-    pi_status = "online"
-    return jsonify({"status": "ok", "timestamp": last_heartbeat})
+    payload = request.get_json(silent=True) or {}
+    name = payload.get("node") or request.args.get("node")
+    node = fleet.heartbeat(name, request.remote_addr)
+    if node is None:
+        return jsonify({"status": "unknown node", "address": request.remote_addr}), 404
+    return jsonify({"status": "ok", "node": node.name, "timestamp": node.last_heartbeat})
 
 
 @app.route('/status', methods=['GET'])
 def status():
     """
-    Endpoint to check Pi status
+    Endpoint to check the status of every Pi
     """
-    global last_heartbeat, pi_status
-    
-    time_since_last = time.time() - last_heartbeat
-    timeout = HEARTBEAT_INTERVAL * 2
+    nodes = fleet.snapshot()
+    offline = [name for name, node in nodes.items() if node["status"] == "offline"]
+    suspect = [name for name, node in nodes.items() if node["status"] == "suspect"]
     
     return jsonify({
-        "pi_status": pi_status,
-        "last_heartbeat": last_heartbeat,
-        "seconds_ago": time_since_last,
-        "timeout_seconds": timeout
+        "pi_status": "offline" if offline else "online",
+        "offline": offline,
+        "suspect": suspect,
+        "nodes": nodes,
+        "udp_listener": fleet.listener.stats() if fleet.listener else None,
+        "phi_warn": PHI_WARN,
+        "phi_block": PHI_BLOCK
     })
 
 
-def monitor_thread():
-    """
-    Background thread to monitor Pi status
-    """
-    global pi_status
-    consecutive_failures = 0
-    max_failures = 3
-    
-    while True:
-        # Check time since last heartbeat
-        time_since_last = time.time() - last_heartbeat
-        
-        # If heartbeat timeout or ping failed
-        if time_since_last > HEARTBEAT_INTERVAL * 2 or not ping(PI_IP):
-            consecutive_failures += 1
-            print(f"Pi connection issue detected. Failure {consecutive_failures}/{max_failures}")
-            
-            if consecutive_failures >= max_failures and pi_status != "offline":
-                print("Pi confirmed offline. Taking action...")
-                pi_status = "offline"
-                
-                # Block device
-                if block_device():
-                    print("Child device blocked successfully")
-                else:
-                    print("Failed to block child device")
-                
-                # Send alert
-                send_alert()
-        else:
-            if consecutive_failures > 0:
-                print("Pi connection restored")
-            consecutive_failures = 0
-            pi_status = "online"
-        
-        time.sleep(HEARTBEAT_INTERVAL)
-
-
 if __name__ == "__main__":
     print(f"Starting Pi Monitor")
-    print(f"Monitoring Pi at {PI_IP}")
+    print(f"Monitoring {len(fleet.nodes)} Pi(s): {', '.join(fleet.nodes)}")
     print(f"Protected device: {CHILD_DEVICE_IP}")
     print(f"Starting server on port {MONITOR_PORT}")
     
-    # Start monitoring thread
-    monitor = threading.Thread(target=monitor_thread, daemon=True)
-    monitor.start()
+    # Start the fleet check loop
+    fleet.start()
     
     # Start Flask server
     app.run(host='0.0.0.0', port=MONITOR_PORT)
\ No newline at end of file
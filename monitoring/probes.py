@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+In-process liveness probes for the Pi monitor.
+
+Probes run on the fleet monitor's asyncio loop instead of forking the ping
+command. ICMP echo goes through one unprivileged datagram socket
+(SOCK_DGRAM/IPPROTO_ICMP, allowed when the user's group is inside
+net.ipv4.ping_group_range), shared by every node and matched by sequence
+number. Where ICMP sockets are not permitted, a TCP connect to the Pi's
+health check port is used instead: an accepted or refused connection both
+prove the host is up.
+"""
+
+import asyncio
+import itertools
+import socket
+import struct
+import time
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+
+
+def checksum(data):
+    """Return the Internet checksum of data"""
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def echo_request(seq, payload=b"pi-monitor"):
+    """Build an ICMP echo request (the kernel fills in the identifier)"""
+    header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, 0, seq)
+    return struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, checksum(header + payload), 0, seq) + payload
+
+
+class Prober:
+    """
+    Probes hosts for liveness and measures the round trip time.
+
+    Args:
+        method: "auto" (ICMP if the socket can be opened, else TCP), "icmp" or "tcp"
+        timeout: Seconds to wait for an answer
+        tcp_port: Port used by TCP probes
+    """
+
+    def __init__(self, method="auto", timeout=1.0, tcp_port=5000):
+        self.method = method
+        self.timeout = timeout
+        self.tcp_port = tcp_port
+        self._sock = None
+        self._pending = {}  # (ip, seq) -> future
+        self._seq = itertools.count(1)
+
+    def open(self):
+        """
+        Open the ICMP socket; must be called from the event loop thread
+
+        Returns:
+            The method in use, "icmp" or "tcp"
+        """
+        if self.method in ("auto", "icmp"):
+            try:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+                sock.setblocking(False)
+                asyncio.get_running_loop().add_reader(sock.fileno(), self._on_reply)
+                self._sock = sock
+                self.method = "icmp"
+            except OSError as e:
+                if self.method == "icmp":
+                    raise
+                print(f"ICMP sockets unavailable ({e}), probing TCP port {self.tcp_port}")
+                self.method = "tcp"
+        return self.method
+
+    def close(self):
+        """Close the ICMP socket"""
+        if self._sock is not None:
+            asyncio.get_running_loop().remove_reader(self._sock.fileno())
+            self._sock.close()
+            self._sock = None
+
+    async def probe(self, host):
+        """
+        Probe one host
+
+        Returns:
+            Round trip time in seconds, or None if the host did not answer
+        """
+        try:
+            if self._sock is not None:
+                return await self._probe_icmp(host)
+            return await self._probe_tcp(host)
+        except (OSError, asyncio.TimeoutError):
+            return None
+
+    async def _probe_icmp(self, host):
+        loop = asyncio.get_running_loop()
+        infos = await loop.getaddrinfo(host, None, family=socket.AF_INET, type=socket.SOCK_DGRAM)
+        ip = infos[0][4][0]
+        seq = next(self._seq) & 0xFFFF
+        future = loop.create_future()
+        self._pending[(ip, seq)] = future
+        started = time.perf_counter()
+        try:
+            self._sock.sendto(echo_request(seq), (ip, 0))
+            await asyncio.wait_for(future, self.timeout)
+            return time.perf_counter() - started
+        finally:
+            self._pending.pop((ip, seq), None)
+
+    def _on_reply(self):
+        # Replies on a datagram ICMP socket start at the ICMP header
+        while True:
+            try:
+                data, address = self._sock.recvfrom(1024)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                continue
+            if len(data) < 8:
+                continue
+            kind, _, _, _, seq = struct.unpack("!BBHHH", data[:8])
+            future = self._pending.get((address[0], seq))
+            if kind == ICMP_ECHO_REPLY and future is not None and not future.done():
+                future.set_result(True)
+
+    async def _probe_tcp(self, host):
+        started = time.perf_counter()
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(host, self.tcp_port),
+                                               self.timeout)
+        except ConnectionRefusedError:
+            # The host answered with a reset, so it is up even if the service is not
+            return time.perf_counter() - started
+        rtt = time.perf_counter() - started
+        writer.close()
+        return rtt
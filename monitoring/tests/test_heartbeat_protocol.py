@@ -0,0 +1,49 @@
+"""Replay and restart handling of SequenceTracker."""
+
+from heartbeat_protocol import SequenceTracker
+
+
+def accept_all(tracker, epoch, seqs, now):
+    return [tracker.accept(epoch, seq, now=now) for seq in seqs]
+
+
+def test_replayed_epoch_does_not_lock_out_the_live_one():
+    tracker = SequenceTracker(switch_after=3)
+    assert accept_all(tracker, 222, (1, 2, 3), now=100) == [True, True, True]
+
+    # A captured datagram of an unknown epoch while 222 is live
+    assert tracker.accept(111, 50, now=101) is False
+    assert accept_all(tracker, 222, (4, 5, 6), now=101) == [True, True, True]
+    assert tracker.epoch == 222
+    assert tracker.stats()["foreign"] == 1
+
+
+def test_replayed_epoch_does_not_count_as_a_heartbeat():
+    tracker = SequenceTracker(switch_after=3)
+    accept_all(tracker, 222, (1, 2), now=100)
+
+    # Replays keep arriving, genuine heartbeats keep winning
+    for step in range(10):
+        assert tracker.accept(111, 50 + step, now=100.5 + step) is False
+        assert tracker.accept(222, 3 + step, now=101 + step) is True
+    assert tracker.stats()["received"] == 12
+
+
+def test_restart_is_accepted_after_silence_without_clock():
+    tracker = SequenceTracker(switch_after=3)
+    accept_all(tracker, 222, (1, 2, 3), now=100)
+
+    # The restarted sender is refused while its old epoch may still be live
+    assert tracker.accept(333, 1, now=101) is False
+    assert accept_all(tracker, 333, (2, 3), now=104) == [True, True]
+    assert tracker.stats()["restarts"] == 1
+
+    # Its previous epoch cannot come back, even after silence
+    assert tracker.accept(222, 4, now=200) is False
+
+
+def test_duplicates_and_reordering_within_an_epoch():
+    tracker = SequenceTracker()
+    assert accept_all(tracker, 7, (1, 3, 2, 3, 2), now=0) == [True, True, True, False, False]
+    stats = tracker.stats()
+    assert (stats["duplicates"], stats["reordered"], stats["lost"]) == (2, 1, 0)
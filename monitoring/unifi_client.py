@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+UniFi CloudKey+ client used to block and unblock devices.
+
+The client logs in once and keeps the session cookie and X-CSRF-Token for
+later commands, so a block costs a single round-trip to the controller. When
+the controller answers 401 (expired session) it logs in again and retries
+the request transparently.
+
+Several devices (a list of MACs and/or named device groups) can be blocked
+at once: the commands are issued concurrently over the same authenticated
+session, with a result per device and an overall deadline.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+
+
+class UniFiError(Exception):
+    """Raised when the controller cannot be reached or rejects a request"""
+
+
+class UniFiClient:
+    """
+    Session-reusing client for the UniFi Network station manager API.
+
+    Args:
+        host: Controller host name or IP
+        username: Controller user
+        password: Controller password
+        site: UniFi site name
+        verify_ssl: Verify the controller certificate
+        timeout: Per-request timeout in seconds
+    """
+
+    def __init__(self, host, username, password, site="default", verify_ssl=True, timeout=10):
+        self.host = host
+        self.username = username
+        self.password = password
+        self.site = site
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(
+            {"Content-Type": "application/json", "Accept": "application/json"})
+        # Verify SSL certificates (can be disabled via environment variable, but not recommended)
+        self.session.verify = verify_ssl
+        self._logged_in = False
+        self._login_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Create a client from the UNIFI_* environment variables"""
+        return cls(
+            host=os.getenv("UNIFI_CONTROLLER", "unifi.example.com"),
+            username=os.getenv("UNIFI_USERNAME", "admin"),
+            password=os.getenv("UNIFI_PASSWORD", "yourpassword"),
+            site=os.getenv("UNIFI_SITE", "default"),
+            verify_ssl=os.getenv("UNIFI_SSL_VERIFY", "true").lower() == "true",
+        )
+
+    def _url(self, path):
+        return f"https://{self.host}{path}"
+
+    def login(self):
+        """Authenticate and store the session cookie and CSRF token"""
+        with self._login_lock:
+            self._login()
+
+    def _login(self):
+        credentials = {"username": self.username, "password": self.password}
+        try:
+            resp = self.session.post(self._url("/api/auth/login"), json=credentials,
+                                     timeout=self.timeout)
+            resp.raise_for_status()
+        except requests.exceptions.RequestException as err:
+            raise UniFiError(f"Failed to connect or authenticate: {err}")
+
+        is_json = resp.headers.get("Content-Type", "").startswith("application/json")
+        if is_json and resp.json().get("meta", {}).get("rc") == "error":
+            # Authentication failed (could be wrong credentials)
+            msg = resp.json().get("meta", {}).get("msg", "")
+            raise UniFiError(f"Login failed. Server response: {msg or resp.status_code}")
+
+        # Store CSRF token if provided (required for subsequent POST commands in newer UniFi versions)
+        self._update_csrf(resp)
+        self._logged_in = True
+
+    def _update_csrf(self, resp):
+        token = resp.headers.get("X-Updated-CSRF-Token") or resp.headers.get("X-CSRF-Token")
+        if token:
+            self.session.headers.update({"X-CSRF-Token": token})
+
+    def logout(self):
+        """Log out and forget the session (optional clean-up on the controller)"""
+        if not self._logged_in:
+            return
+        try:
+            self.session.post(self._url("/proxy/network/api/logout"), timeout=5)
+        except requests.exceptions.RequestException:
+            pass
+        self._logged_in = False
+        self.session.cookies.clear()
+        self.session.headers.pop("X-CSRF-Token", None)
+
+    def _request(self, method, path, **kwargs):
+        """Send an authenticated request, logging in again once on 401"""
+        kwargs.setdefault("timeout", self.timeout)
+        for attempt in range(2):
+            if not self._logged_in:
+                with self._login_lock:
+                    if not self._logged_in:
+                        self._login()
+            try:
+                resp = self.session.request(method, self._url(path), **kwargs)
+            except requests.exceptions.Timeout:
+                raise UniFiError("Request to controller timed out")
+            except requests.exceptions.RequestException as err:
+                raise UniFiError(f"Failed to send request - {err}")
+
+            if resp.status_code == 401 and attempt == 0:
+                # Session expired on the controller
+                self._logged_in = False
+                continue
+            break
+
+        self._update_csrf(resp)
+        if not resp.ok:
+            raise UniFiError(f"HTTP {resp.status_code} - {resp.text}")
+        result = resp.json()
+        if result.get("meta", {}).get("rc") != "ok":
+            raise UniFiError(f"Controller error: {result.get('meta', {}).get('msg', 'Unknown error')}")
+        return result
+
+    def station_command(self, cmd, mac):
+        """Send a station manager command (e.g. block-sta) for a MAC address"""
+        # ensure MAC is lower-case
+        payload = {"cmd": cmd, "mac": mac.lower()}
+        return self._request("POST", f"/proxy/network/api/s/{self.site}/cmd/stamgr", json=payload)
+
+    def block(self, mac):
+        """Block network access for a device"""
+        self.station_command("block-sta", mac)
+
+    def unblock(self, mac):
+        """Restore network access for a device"""
+        self.station_command("unblock-sta", mac)
+
+    def bulk_command(self, cmd, macs, deadline=30, max_workers=8):
+        """
+        Send a station manager command to several devices concurrently
+
+        Args:
+            cmd: Command such as "block-sta" or "unblock-sta"
+            macs: MAC addresses
+            deadline: Seconds to wait for all devices
+            max_workers: Upper bound on parallel requests
+
+        Returns:
+            {mac: None on success, error message otherwise}
+        """
+        if not macs:
+            return {}
+
+        # Log in once up front so the workers share one session
+        try:
+            if not self._logged_in:
+                self.login()
+        except UniFiError as err:
+            return {mac: str(err) for mac in macs}
+
+        executor = ThreadPoolExecutor(max_workers=min(max_workers, len(macs)),
+                                      thread_name_prefix="unifi-bulk")
+        futures = {executor.submit(self.station_command, cmd, mac): mac for mac in macs}
+        done, not_done = wait(futures, timeout=deadline)
+
+        results = {}
+        for future in done:
+            error = future.exception()
+            results[futures[future]] = None if error is None else str(error)
+        for future in not_done:
+            future.cancel()
+            results[futures[future]] = f"No response within the {deadline}s deadline"
+        executor.shutdown(wait=False)
+        return results
+
+    def block_many(self, macs, deadline=30):
+        """Block several devices concurrently; returns {mac: error or None}"""
+        return self.bulk_command("block-sta", macs, deadline)
+
+    def unblock_many(self, macs, deadline=30):
+        """Unblock several devices concurrently; returns {mac: error or None}"""
+        return self.bulk_command("unblock-sta", macs, deadline)
+
+    def is_blocked(self, mac):
+        """Return True if the controller reports the device as blocked"""
+        result = self._request("GET", f"/proxy/network/api/s/{self.site}/stat/user/{mac.lower()}")
+        clients = result.get("data", [])
+        return bool(clients and clients[0].get("blocked", False))
+
+
+def parse_macs(value):
+    """Split a comma-separated list of MAC addresses"""
+    return [mac.strip().lower() for mac in value.split(",") if mac.strip()]
+
+
+def load_device_groups():
+    """Return {group: [macs]} from the DEVICE_GROUP_<NAME> environment variables"""
+    groups = {}
+    for key, value in os.environ.items():
+        if key.startswith("DEVICE_GROUP_"):
+            groups[key[len("DEVICE_GROUP_"):].lower()] = parse_macs(value)
+    return groups
+
+
+def resolve_targets(names=None):
+    """
+    Turn group names and MAC addresses into a list of MAC addresses
+
+    Args:
+        names: Group names and/or MACs; when empty, every configured device
+            (CHILD_DEVICE_MACS, or CHILD_DEVICE_MAC, plus all device groups)
+
+    Returns:
+        De-duplicated list of lower-case MAC addresses
+    """
+    groups = load_device_groups()
+    if not names:
+        macs = (parse_macs(os.getenv("CHILD_DEVICE_MACS", ""))
+                or parse_macs(os.getenv("CHILD_DEVICE_MAC", "AA:BB:CC:DD:EE:FF")))
+        for group in groups.values():
+            macs += group
+    else:
+        macs = []
+        for name in names:
+            macs += groups.get(name.lower(), [name.lower()])
+    return list(dict.fromkeys(macs))
+
+
+_shared_client = None
+_shared_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide client, created from the environment on first use"""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = UniFiClient.from_env()
+        return _shared_client